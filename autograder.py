@@ -0,0 +1,114 @@
+import json
+import os
+import platform
+import signal
+import subprocess
+import threading
+import time
+
+PASSED = 'passed'
+FAILED = 'failed'
+TIMED_OUT = 'timed out'
+ERROR = 'error'  # the command couldn't be started, or the commit couldn't be checked out
+CACHED_STATUSES = (PASSED, FAILED)  # a timeout or an error may not happen again, so those are run again next time
+
+
+def run_command(command, cwd, timeout, log_file_name):
+    # runs command (a shell string or an argument list) in cwd with stdout and stderr going to log_file_name, and kills
+    # it and everything it started (e.g. a Gradle daemon) after timeout seconds
+    log_folder = os.path.dirname(log_file_name)
+    if log_folder != '' and not os.path.isdir(log_folder):
+        os.makedirs(log_folder)
+
+    started = time.time()
+    killed = threading.Event()
+    with open(log_file_name, 'w') as log_file:
+        try:
+            process = subprocess.Popen(command, cwd=cwd, shell=isinstance(command, basestring), stdout=log_file,
+                                       stderr=subprocess.STDOUT, preexec_fn=get_process_group_setup())
+        except OSError, e:
+            log_file.write('%s\n' % e)
+            return get_result(ERROR, None, started, log_file_name)
+
+        def kill():
+            if kill_process_tree(process):
+                killed.set()
+
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+        try:
+            exit_code = process.wait()
+        finally:
+            timer.cancel()
+
+    if was_killed(exit_code, killed):
+        return get_result(TIMED_OUT, exit_code, started, log_file_name)
+
+    return get_result(PASSED if exit_code == 0 else FAILED, exit_code, started, log_file_name)
+
+
+def get_result(status, exit_code, started, log_file_name):
+    return {'status': status, 'exit code': exit_code, 'seconds': round(time.time() - started, 1), 'log': log_file_name}
+
+
+def was_killed(exit_code, killed):
+    # the timer can fire just as the command finishes by itself; that's only a timeout if the kill is what ended it
+    if not killed.is_set():
+        return False
+
+    return platform.system() == 'Windows' or exit_code == -signal.SIGKILL
+
+
+def get_process_group_setup():
+    # the command gets its own process group, so a timeout can kill the build tools it started too
+    if platform.system() == 'Windows':
+        return None
+
+    return os.setsid
+
+
+def kill_process_tree(process):
+    # True if anything was killed
+    try:
+        if platform.system() == 'Windows':
+            return subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)]) == 0
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+            return True
+    except OSError:
+        return False  # it finished in the meantime
+
+
+class ResultCache:
+    # assignment -> commit SHA -> {'command', 'result'}, so a commit that has been built and tested isn't run again
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        try:
+            with open(file_name, 'r') as cache_file:
+                self._results = json.load(cache_file)
+        except (IOError, ValueError):
+            self._results = {}  # nothing autograded yet
+
+    def get(self, assignment, sha, command):
+        # a changed command means the cached result is for a different test run
+        with self._lock:
+            cached = self._results.get(assignment, {}).get(sha)
+
+        if cached == None or cached['command'] != command or cached['result']['status'] not in CACHED_STATUSES:
+            return None
+
+        return cached['result']
+
+    def put(self, assignment, sha, command, result):
+        if result['status'] not in CACHED_STATUSES:
+            return
+
+        with self._lock:
+            self._results.setdefault(assignment, {})[sha] = {'command': command, 'result': result}
+
+    def save(self):
+        with self._lock:
+            with open(self.file_name, 'w') as cache_file:
+                json.dump(self._results, cache_file)
@@ -0,0 +1,267 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+import prep_repos
+
+'''
+Generates a synthetic class (roster, teams, T-Square submission folders and local bare git repos) and times prep_repos
+and generate_report against it. Nothing goes over the network; Submissions is pointed at the repos with a file:// git_host.
+
+Examples:
+    python benchmark.py
+    python benchmark.py --sizes 50 500 2000 --workers 1 8 16
+    python benchmark.py --sizes 200 --workers 4 --function prep_repos_async --output results.json
+'''
+
+ASSIGNMENT = "Assignment 1"
+TEAM_ASSIGNMENT = "Deliverable 1"
+DEADLINE = "2017-09-09 12:00:00"
+DEADLINE_EPOCH = 1504958400  # DEADLINE as UTC epoch seconds
+FOLDER_PREFIX = "6300Bench"
+GIT_CONTEXT = "bench-context"
+TEAM_SIZE = 4
+
+
+class SyntheticClass:
+    # one class of students on disk: students_full.txt, student_teams.txt, submissions/ and remotes/<git context>/*.git
+    def __init__(self, root, student_count, commits_per_repo=5, file_size=4096, seed=0):
+        self.root = os.path.abspath(root)
+        self.student_count = student_count
+        self.commits_per_repo = commits_per_repo
+        self.file_size = file_size
+        self.seed = seed
+
+        self.students_filename = os.path.join(self.root, "students_full.txt")
+        self.teams_filename = os.path.join(self.root, "student_teams.txt")
+        self.submissions_folder = os.path.join(self.root, "submissions")
+        self.remotes_folder = os.path.join(self.root, "remotes")
+        self.settings_filename = os.path.join(self.root, "synthetic_class.json")
+
+    def get_settings(self):
+        return {'student_count': self.student_count, 'commits_per_repo': self.commits_per_repo,
+                'file_size': self.file_size, 'seed': self.seed}
+
+    def get_teams(self):
+        return ["Team%03d" % team for team in range((self.student_count + TEAM_SIZE - 1) // TEAM_SIZE)]
+
+    def get_git_host(self):
+        return "file://" + self.remotes_folder
+
+    def is_generated(self):
+        try:
+            with open(self.settings_filename, 'r') as settings_file:
+                return json.load(settings_file) == self.get_settings()
+        except (IOError, ValueError):
+            return False
+
+    def generate(self):
+        # slow for big classes (two git processes per repo), so it's skipped if the same class is already on disk
+        if self.is_generated():
+            return
+
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(os.path.join(self.remotes_folder, GIT_CONTEXT))
+
+        rng = random.Random(self.seed)
+        students = []  # (name, gt_id, t_square_id)
+        for student in range(self.student_count):
+            students.append(("Student%04d" % student, "bench%04d" % student, "%08x" % rng.getrandbits(32)))
+
+        with open(self.students_filename, 'w') as students_file:
+            for name, gt_id, t_square_id in students:
+                students_file.write('%s\t%s\t%s\n' % (name, gt_id, t_square_id))
+
+        with open(self.teams_filename, 'w') as teams_file:
+            for index, (name, gt_id, t_square_id) in enumerate(students):
+                teams_file.write('%s\t%s\t%s\n' % (gt_id, name, self.get_teams()[index // TEAM_SIZE]))
+
+        team_commits = {}
+        for team in self.get_teams():
+            team_commits[team] = self.create_repo(team, rng)
+
+        for index, (name, gt_id, t_square_id) in enumerate(students):
+            folder = "%s(%s)" % (name, t_square_id)
+            self.create_submission(ASSIGNMENT, folder, self.create_repo(gt_id, rng), rng)
+            self.create_submission(TEAM_ASSIGNMENT, folder, team_commits[self.get_teams()[index // TEAM_SIZE]], rng)
+
+        with open(self.settings_filename, 'w') as settings_file:
+            json.dump(self.get_settings(), settings_file)
+
+    def create_repo(self, repo_suffix, rng):
+        # a bare repo with commits_per_repo commits a day apart, the last one after the deadline; returns (sha, epoch)
+        repo_path = os.path.join(self.remotes_folder, GIT_CONTEXT, "%s%s.git" % (FOLDER_PREFIX, repo_suffix))
+        subprocess.check_output(['git', 'init', '--bare', '-q', repo_path])
+        with open(os.path.join(repo_path, 'HEAD'), 'w') as head_file:
+            head_file.write('ref: refs/heads/master\n')  # whatever init.defaultBranch is set to
+
+        epochs = [DEADLINE_EPOCH - 86400 * (self.commits_per_repo - 1 - commit) + rng.randint(-3600, 3600)
+                  for commit in range(self.commits_per_repo)]
+        stream = []
+        for commit, epoch in enumerate(epochs):
+            message = 'commit %s\n' % commit
+            content = ''.join([rng.choice('abcdefghijklmnopqrstuvwxyz \n') for _ in range(self.file_size)])
+            stream.append('commit refs/heads/master\nmark :%s\n' % (commit + 1))
+            stream.append('committer Bench <bench@example.com> %s +0000\n' % epoch)
+            stream.append('data %s\n%s' % (len(message), message))
+            stream.append('M 644 inline src/file%s.txt\ndata %s\n%s\n' % (commit % 3, len(content), content))
+
+        marks_filename = os.path.join(repo_path, 'marks')
+        process = subprocess.Popen(['git', 'fast-import', '--quiet', '--export-marks=%s' % marks_filename],
+                                   cwd=repo_path, stdin=subprocess.PIPE)
+        process.communicate(''.join(stream))
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, 'git fast-import')
+
+        with open(marks_filename, 'r') as marks_file:
+            shas = dict([line.split() for line in marks_file])
+        os.remove(marks_filename)
+
+        return [(shas[':%s' % (commit + 1)], epoch) for commit, epoch in enumerate(epochs)]
+
+    def create_submission(self, assignment, folder, commits, rng):
+        # mostly on time, with some of every case the report picks up: late, abbreviated, invalid, bad and missing
+        folder_path = os.path.join(self.submissions_folder, assignment, folder)
+        os.makedirs(folder_path)
+
+        kind = rng.random()
+        if kind < 0.05:
+            return  # empty folder: nothing submitted
+
+        submitted = time.gmtime(DEADLINE_EPOCH - rng.randint(-8 * 3600, 3 * 86400))
+        with open(os.path.join(folder_path, 'timestamp.txt'), 'w') as timestamp_file:
+            timestamp_file.write(time.strftime('%Y%m%d%H%M%S', submitted) + '000')
+
+        if kind < 0.75:
+            text = '<p>%s</p>' % commits[-2][0]
+        elif kind < 0.85:
+            text = '<p>%s</p>' % commits[-1][0]  # after the deadline
+        elif kind < 0.9:
+            text = '<a href="https://github.gatech.edu/%s/commit/%s">commit</a>' % (folder, commits[-2][0][:10])
+        elif kind < 0.95:
+            text = '<p>my commit is the latest one</p>'
+        else:
+            text = '<p>%040x</p>' % rng.getrandbits(160)  # not in the repo
+
+        with open(os.path.join(folder_path, folder + '_submissionText.html'), 'w') as submission_file:
+            submission_file.write(text)
+
+
+@contextlib.contextmanager
+def quiet(verbose=False):
+    # prep_repos and generate_report print a line per student and git prints progress, which would swamp the results
+    if verbose:
+        yield
+        return
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        os.dup2(devnull.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    function(*args, **kwargs)
+    return time.time() - start
+
+
+def run_benchmark(synthetic_class, work_folder, max_workers, function='prep_repos', verbose=False):
+    # one fresh working folder; the first prep clones every repo, the second only fetches
+    if os.path.isdir(work_folder):
+        shutil.rmtree(work_folder)
+    os.makedirs(work_folder)
+
+    cwd = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        submissions = prep_repos.Submissions()
+        submissions.folder_prefix = FOLDER_PREFIX
+        submissions.git_context = GIT_CONTEXT
+        submissions.git_host = synthetic_class.get_git_host()
+        submissions.max_workers = max_workers
+        submissions.create_student_json(synthetic_class.students_filename)
+        submissions.create_team_json(synthetic_class.teams_filename)
+
+        prep = getattr(submissions, function)
+        assignment_folder = os.path.join(synthetic_class.submissions_folder, ASSIGNMENT)
+        team_assignment_folder = os.path.join(synthetic_class.submissions_folder, TEAM_ASSIGNMENT)
+        teams = synthetic_class.get_teams()
+
+        results = {'students': synthetic_class.student_count, 'max_workers': max_workers, 'function': function}
+        with quiet(verbose):
+            results['prep (clone)'] = timed(prep, assignment_folder, DEADLINE)
+            results['prep (fetch)'] = timed(prep, assignment_folder, DEADLINE)
+            results['team prep'] = timed(prep, team_assignment_folder, DEADLINE, teams, is_team_project=True)
+            results['report'] = timed(submissions.generate_report, ASSIGNMENT, None, 'report.txt', echo=False)
+            results['team report'] = timed(submissions.generate_report, TEAM_ASSIGNMENT, teams, 'team_report.txt',
+                                           is_team_project=True, echo=False)
+    finally:
+        os.chdir(cwd)
+
+    return results
+
+
+def print_results(results):
+    columns = ['prep (clone)', 'prep (fetch)', 'team prep', 'report', 'team report']
+    print '%8s %8s ' % ('STUDENTS', 'WORKERS') + ' '.join(['%20s' % column for column in columns])
+    for result in results:
+        print '%8d %8d ' % (result['students'], result['max_workers']) + ' '.join(
+            ['%7.2f s %6.0f/s' % (result[column], result['students'] / max(result[column], 0.001)) for column in columns])
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Time prep_repos and generate_report on a synthetic class.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200], help='class sizes (students)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='max_workers settings to try')
+    parser.add_argument('--function', default='prep_repos', choices=['prep_repos', 'prep_repos_async'])
+    parser.add_argument('--commits', type=int, default=5, help='commits per repo')
+    parser.add_argument('--file-size', type=int, default=4096, help='bytes added per commit')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--root', default='benchmark_data', help='where the synthetic classes and runs go')
+    parser.add_argument('--output', help='also save the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='show prep_repos and git output')
+    options = parser.parse_args(arguments)
+
+    results = []
+    for size in options.sizes:
+        synthetic_class = SyntheticClass(os.path.join(options.root, 'class_%s' % size), size, options.commits,
+                                         options.file_size, options.seed)
+        print 'Generating %s students...' % size
+        synthetic_class.generate()
+
+        for max_workers in options.workers:
+            print 'Running %s students, max_workers = %s...' % (size, max_workers)
+            work_folder = os.path.abspath(os.path.join(options.root, 'run_%s_%s' % (size, max_workers)))
+            results.append(run_benchmark(synthetic_class, work_folder, max_workers, options.function, options.verbose))
+
+    print
+    print_results(results)
+
+    if options.output != None:
+        with open(options.output, 'w') as output_file:
+            json.dump(results, output_file, indent=1)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import collections
+import subprocess
+import threading
+
+Commit = collections.namedtuple('Commit', ['sha', 'timestamp', 'timezone'])  # timestamp is the committer time in UTC epoch seconds
+
+
+class GitRepo:
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self._process = None  # long-lived 'git cat-file --batch', started on first lookup
+        self._commits = {}  # commit ID -> Commit, or None if it doesn't resolve to a commit
+        self._history = None  # every Commit reachable from a ref, read on first get_history
+        self._lock = threading.Lock()
+
+    def get_commits(self, commit_ids):
+        with self._lock:
+            results = {}
+            for commit_id in commit_ids:
+                if commit_id not in self._commits:
+                    self._commits[commit_id] = self._read_commit(commit_id)
+                results[commit_id] = self._commits[commit_id]
+
+        return results
+
+    def get_commit(self, commit_id):
+        return self.get_commits([commit_id])[commit_id]
+
+    def get_history(self):
+        # one 'git log' walk over every branch, tag and remote ref, rather than a lookup per commit
+        with self._lock:
+            if self._history is None:
+                output = subprocess.check_output(['git', 'log', '--all', '--format=%H %ct %ci'], cwd=self.repo_path)
+                self._history = []
+                for line in output.splitlines():
+                    parsed = line.split()
+                    if len(parsed) == 5:  # sha, committer epoch, committer date, time and timezone
+                        commit = Commit(parsed[0], int(parsed[1]), parsed[4])
+                        self._history.append(commit)
+                        self._commits[commit.sha] = commit
+
+            return self._history
+
+    def forget(self):
+        # call after fetching so refs and objects are looked up again
+        with self._lock:
+            self._commits = {}
+            self._history = None
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                self._process.wait()
+                self._process = None
+
+    def _get_process(self):
+        if self._process is None:
+            self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=self.repo_path,
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return self._process
+
+    def get_files(self, commit_id, paths=None, max_size=None):
+        # (path, contents) for every file in the commit, or only those under paths; contents come through the
+        # cat-file process instead of the working tree, so it works for any commit without checking it out
+        arguments = ['git', 'ls-tree', '-r', '-l', '-z', commit_id] + (['--'] + list(paths) if paths else [])
+        output = subprocess.check_output(arguments, cwd=self.repo_path)
+
+        files = []
+        with self._lock:
+            for entry in output.split('\0'):
+                if entry == '':
+                    continue
+
+                info, path = entry.split('\t', 1)
+                mode, object_type, sha, size = info.split()
+                if object_type != 'blob' or (max_size is not None and int(size) > max_size):
+                    continue  # submodules, and files too big to be worth reading
+
+                blob = self._read_object(sha)
+                if blob is not None:
+                    files.append((path, blob[2]))
+
+        return files
+
+    def _read_object(self, object_name):
+        # (sha, type, contents), or None if it doesn't exist
+        if len(object_name.strip()) == 0 or '\n' in object_name:
+            return None
+
+        process = self._get_process()
+        process.stdin.write('%s\n' % object_name)
+        process.stdin.flush()
+
+        header = process.stdout.readline()
+        if header == '':
+            # not an IOError, which callers would take for a missing records or submission file
+            raise subprocess.CalledProcessError(process.wait(), 'git cat-file --batch in %s' % self.repo_path)
+
+        parsed = header.split()
+        if len(parsed) != 3:  # '<name> missing' or '<name> ambiguous'
+            return None
+
+        sha, object_type, size = parsed
+        contents = process.stdout.read(int(size) + 1)[:-1]  # object contents plus trailing newline
+
+        return sha, object_type, contents
+
+    def _read_commit(self, commit_id):
+        commit = self._read_object('%s^{commit}' % commit_id) if len(commit_id.strip()) > 0 else None
+        if commit is None:
+            return None
+
+        sha, object_type, body = commit
+        for line in body.split('\n'):
+            if line == '':  # end of commit headers
+                break
+            if line.startswith('committer '):
+                timestamp, timezone = line.rsplit(' ', 2)[1:]
+                return Commit(sha, int(timestamp), timezone)
+
+        return None
@@ -1,22 +1,78 @@
-import datetime
+import calendar
+import hashlib
 import json
 import os
-import re
+import Queue
 import subprocess
+import sys
+import threading
+import time
 import platform
+from multiprocessing.pool import ThreadPool
+
+import autograder
+import git_backend
+import profiler
+import record_store
+import records
+import report
+import roster
+import similarity
+import submission_parser
+import workspace
 
 class Submissions:
     def __init__(self):
         self.folder_prefix = "6300Fall17"
         self.git_context = "gt-omscs-se-2017fall"
+        self.git_host = "https://github.gatech.edu"  # or e.g. "file:///path/to/remotes" for local repos
         self.student_records_filename = "student_records.json"
+        self.student_records_db_filename = "student_records.db"
+        self.record_store = "json"  # or "sqlite" to keep per-assignment results in student_records_db_filename
+        self.checkpoint_filename = "prep_repos_checkpoint.json"
+        self.resume = False  # pick up an interrupted prep_repos run where it left off
         self.student_alias_filename = "student_aliases.json"
         self.team_records_filename = "student_records_teams.json"
         self.team_members_filename = "student_records_team_members.json"
         self.datetime_format = "%Y-%m-%d %H:%M:%S"
+        self.grace_period = 0  # seconds after the deadline (or an extension) that still count as on time
         self.pull_from_github = True
-        self._temp = {}  # cache some dictionary info here to save on IO operations
-        self._pulled_teams = []  # don't pull team repos up to 4x if you can avoid it
+        self.max_workers = 1  # number of repos to clone/pull at the same time
+        self.checkout_commits = True  # False only verifies commits and leaves working trees alone; use checkout_submission later
+        self.incremental = False  # skip students whose submission and repo haven't changed since the last run
+        self.repo_state_filename = "repo_state.json"
+        self.reference_repo_url = None  # course template repo; student clones borrow its objects instead of copying them
+        self.reference_repo_path = os.path.join("Repos", "reference.git")
+        self.clone_depth = None  # e.g. 1 for shallow clones; older commits won't resolve
+        self.clone_filter = None  # e.g. 'blob:none' for partial clones; file contents are fetched on checkout
+        self.profile = False  # time every stage per student/repo; writes trace_filename and prints a summary after each run
+        self.trace_filename = "prep_repos_trace.json"
+        self.warm_cache_filename = "warm_cache.json"
+        self.warm_cache_max_age = None  # seconds; prep_repos won't pull repos keep_repos_warm fetched more recently than this
+        self.warm_fetches_per_minute = 60  # keep_repos_warm's rate limit, so GitHub doesn't throttle us
+        self.find_fallback_commits = True  # for submissions without a valid commit, find the commits either side of the deadline
+        self.autograde_workers = 1  # build/test commands run at the same time; each is its own process
+        self.autograde_timeout = 10 * 60  # seconds before a build/test command is killed and reported as timed out
+        self.autograde_cache_filename = "autograde_cache.json"
+        self.autograde_log_folder = "autograde_logs"  # full build/test output, one log per repo and commit
+        self.similarity_cache_filename = "similarity_cache.json"  # MinHash signatures by commit SHA
+        self.workspace_budget = None  # bytes Repos/ may use; the least recently graded repos are compacted, then removed, past it
+        self.workspace_filename = "workspace.json"
+        self._roster = None  # roster.Roster, built on first lookup
+        self._pulled_teams = set()  # don't pull team repos up to 4x if you can avoid it
+        self._git_repos = {}  # repo suffix -> git_backend.GitRepo, so each repo is only opened once
+        self._repo_locks = {}  # repo suffix -> threading.Lock, so team members don't check out the same repo at once
+        self._lock = threading.Lock()  # guards the two dictionaries above
+        self._repo_state = {}  # incremental mode: repo name -> last fetched ref and processed submissions
+        self._remote_refs = {}  # incremental mode: repo suffix -> digest of every remote ref for this run
+        self._submission_files = {}  # submission folder or zip name -> submission_parser.SubmissionFolder/SubmissionArchive
+        self._prepared_repos = None  # prep_term: repo suffix -> whether the up-front clone/pull succeeded
+        self._profiler = None  # profiler.StageProfiler while a profiled run is going
+        self._profiling_depth = 0  # prep_term's prep_repos runs go into its trace instead of their own
+        self._warm_cache = {}  # repo suffix -> {'fetched_at': epoch seconds} from the last keep_repos_warm fetch
+        self._warm_cache_mtime = None  # keep_repos_warm usually runs in another process, so reload when the file changes
+        self._next_fetch_time = 0  # keep_repos_warm: when the rate limit allows the next fetch
+        self._used_repos = set()  # repo folder names set up or checked out since the workspace was last managed
 
     def create_student_json(self, input_file_name):
         try:
@@ -42,6 +98,10 @@ class Submissions:
                 json.dump(students, output_file)
             with open(self.student_alias_filename, 'w') as alias_file:
                 json.dump(gt_ids, alias_file)
+            self.forget_roster()
+
+            if self.record_store != "json":
+                self.import_student_records(self.student_records_filename)
         except IOError:
             raise IOError('create_student_json: couldn\'t find file with name %s. Exiting.' % input_file_name)
 
@@ -70,400 +130,1452 @@ class Submissions:
                 json.dump(students, student_teams_file)
             with open(self.team_members_filename, 'w') as team_members_file:
                 json.dump(teams, team_members_file)
+            self.forget_roster()
 
         except IOError:
             raise IOError("create_team_json couldn\'t find file with name %s" % input_file_name)
 
-    def prep_repos(self, submission_folder_name, deadline, whitelist=None, is_team_project=False):
+    def prep_repos(self, submission_folder_name, deadline, whitelist=None, is_team_project=False, extensions=None, sparse_paths=None,
+                   autograde_command=None, similarity_threshold=None):
+        # submission_folder_name can also be the bulk download zip from T-Square; it's read without extracting it.
+        # extensions: gt_id or team -> that student's or team's own deadline, in the same format as deadline.
+        # sparse_paths: the folders this assignment is graded on, e.g. ['Assignment3']; nothing else is checked out.
+        # autograde_command: build/test command run in each repo at the graded commit, e.g. 'cd Assignment3 && gradle test'.
+        # similarity_threshold: e.g. 0.8 to flag pairs of submissions whose files (under sparse_paths) are that similar
+        deadlines = self.get_deadlines(deadline, extensions)  # a typo in a deadline fails here, before any git work
+        submission_files = self.get_submission_files(submission_folder_name)
         assignment_alias = self.get_assignment_alias(submission_folder_name)
 
         if not os.path.isdir("Repos"):
             os.makedirs("Repos")
 
-        if not os.path.isdir(submission_folder_name):
-            raise IOError("Submission folder name '%s' not found. Exiting." % submission_folder_name)
+        record_store = self.open_record_store()
+        checkpoint = self.open_checkpoint(assignment_alias, deadline, whitelist, is_team_project)
+        self.start_profiling()
+        try:
+            students = self.load_students(record_store, assignment_alias, 'prep_repos')
+
+            # every repo set up and every student finished is saved to the checkpoint right away, so a crash only loses
+            # the repos and the students in progress
+            finished, set_up_repos = self.resume_checkpoint(checkpoint, assignment_alias)
+
+            if self.incremental:
+                self._repo_state = self.load_repo_state()
+
+            pending = []  # (t_square_id, record) for students whose submissions still need git checks
+            graded = []  # (t_square_id, record) for every student graded in this run, for the deadline check
+            unchanged = []  # incremental mode: (t_square_id, folder, record, cached result) to skip if the repo is unchanged too
+            submission_mtimes = {}
+            graded_teams = set()
+            for t_square_id, folder, current_student in self.get_student_folders(submission_files, students, whitelist, is_team_project):
+                if is_team_project:
+                    graded_teams.add(self.get_repo_suffix(current_student, is_team_project))
+
+                if t_square_id in finished:
+                    current_student.results[assignment_alias] = finished[t_square_id]
+                    students[t_square_id] = current_student
+                    graded.append((t_square_id, current_student))
+                    continue
 
-        if is_team_project:
-            teams = self.get_dictionary_from_json_file(self.team_records_filename)
+                if self.incremental:
+                    submission_mtimes[t_square_id] = self.get_submission_mtime(submission_folder_name, folder)
+                    cached_result = self.get_cached_result(current_student, t_square_id, assignment_alias, submission_mtimes[t_square_id], is_team_project)
+                    if cached_result != None:
+                        unchanged.append((t_square_id, folder, current_student, cached_result))
+                        continue
+
+                current_student = self.read_submission(current_student, t_square_id, submission_folder_name, folder, assignment_alias)
+                pending.append((t_square_id, current_student))
+
+            if self.incremental:
+                repo_suffixes = set([self.get_repo_suffix(student, is_team_project) for _, student in pending])
+                repo_suffixes.update([self.get_repo_suffix(student, is_team_project) for _, _, student, _ in unchanged])
+                self._remote_refs = self.get_remote_refs(repo_suffixes)
+
+                for t_square_id, folder, current_student, cached_result in unchanged:
+                    if self.is_repo_up_to_date(self.get_repo_suffix(current_student, is_team_project)):
+                        current_student.results[assignment_alias] = cached_result
+                        if not is_team_project:  # team repos are all checked out at the end
+                            self.checkout_cached_commit(current_student, cached_result)
+                        students[t_square_id] = current_student
+                        graded.append((t_square_id, current_student))
+                        checkpoint.save(t_square_id, cached_result)
+                    else:
+                        current_student = self.read_submission(current_student, t_square_id, submission_folder_name, folder, assignment_alias)
+                        pending.append((t_square_id, current_student))
+
+            if self.reference_repo_url != None:
+                self.setup_reference_repo()
+
+            # clone repos if needed - note that you'll need to authenticate with github here; debugger may not work properly
+            failed_repos = self.setup_student_repos([student for _, student in pending], is_team_project, sparse_paths, assignment_alias,
+                                                    checkpoint, set_up_repos)
+
+            if is_team_project:
+                self.resolve_team_commits(pending, assignment_alias)
+
+            for t_square_id, current_student in pending:
+                current_student = self.check_student_submission(current_student, assignment_alias, is_team_project, failed_repos)
 
+                # save info
+                students[t_square_id] = current_student
+                graded.append((t_square_id, current_student))
+                with self.profile_stage('save records', current_student.gt_id):
+                    checkpoint.save(t_square_id, current_student.results[assignment_alias])
+
+            # every timestamp is known now, so check them all against their deadlines at once
+            with self.profile_stage('deadline check'):
+                self.evaluate_deadlines(graded, assignment_alias, deadlines, is_team_project)
+
+            self.finish_assignment(record_store, checkpoint, students, graded, graded_teams, assignment_alias, deadlines,
+                                   whitelist, is_team_project, failed_repos, sparse_paths, autograde_command, similarity_threshold)
+
+            if self.incremental:
+                self.update_repo_state(pending, failed_repos, submission_mtimes, assignment_alias, is_team_project)
+                self.save_repo_state()
+
+        finally:
+            self.close_run(record_store, checkpoint, {'function': 'prep_repos', 'assignment': assignment_alias, 'deadline': deadline,
+                                                      'is_team_project': is_team_project, 'max_workers': self.max_workers})
+
+    def prep_repos_async(self, submission_folder_name, deadline, whitelist=None, is_team_project=False, extensions=None, sparse_paths=None,
+                         autograde_command=None, similarity_threshold=None):
+        # same records as prep_repos, but submissions are parsed on their own thread while git work for students parsed
+        # earlier runs on max_workers threads, and each result is saved as soon as it's ready
+        if self.incremental:
+            print 'prep_repos_async doesn\'t support incremental mode; running prep_repos instead'
+            return self.prep_repos(submission_folder_name, deadline, whitelist, is_team_project, extensions, sparse_paths,
+                                   autograde_command, similarity_threshold)
+
+        deadlines = self.get_deadlines(deadline, extensions)
+        submission_files = self.get_submission_files(submission_folder_name)
+        assignment_alias = self.get_assignment_alias(submission_folder_name)
+
+        if not os.path.isdir("Repos"):
+            os.makedirs("Repos")
+
+        record_store = self.open_record_store()
+        checkpoint = self.open_checkpoint(assignment_alias, deadline, whitelist, is_team_project)
+        self.start_profiling()
         try:
-            students = None
+            students = self.load_students(record_store, assignment_alias, 'prep_repos_async')
+
+            finished, set_up_repos = self.resume_checkpoint(checkpoint, assignment_alias)
+
+            if self.reference_repo_url != None:
+                self.setup_reference_repo()
+
+            worker_count = max(1, self.max_workers)
+            parsed_submissions = Queue.Queue(worker_count * 4)  # lets parsing run ahead without reading the whole class
+            results = Queue.Queue()  # (t_square_id, record, exc_info); None when a worker is done
+            stop = threading.Event()
+            repos_ready = {}  # repo suffix -> threading.Event, set once the repo has been cloned/pulled
+            failed_repos = set()
+            graded_teams = set()
+            graded = []  # (t_square_id, record) for every student saved, for the autograder
+
+            def parse():
+                try:
+                    for t_square_id, folder, current_student in self.get_student_folders(submission_files, students, whitelist, is_team_project):
+                        if stop.is_set():
+                            break
+                        if is_team_project:
+                            graded_teams.add(self.get_repo_suffix(current_student, is_team_project))
+                        if t_square_id in finished:
+                            current_student.results[assignment_alias] = finished[t_square_id]
+                            results.put((t_square_id, current_student, None))
+                            continue
 
-            with open(self.student_records_filename, 'r+') as student_records_file:
-                students = json.load(student_records_file)
+                        current_student = self.read_submission(current_student, t_square_id, submission_folder_name, folder, assignment_alias)
+                        parsed_submissions.put((t_square_id, current_student))
+                except Exception:
+                    results.put((None, None, sys.exc_info()))
+                finally:
+                    for _ in range(worker_count):
+                        parsed_submissions.put(None)
+
+            def setup_repo(current_student):
+                repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+                with self._lock:
+                    is_first = repo_suffix not in repos_ready
+                    if is_first:
+                        repos_ready[repo_suffix] = threading.Event()
+
+                if not is_first:
+                    repos_ready[repo_suffix].wait()
+                    return
+
+                result = current_student.results[assignment_alias]
+                try:
+                    if not self.setup_student_repo_safely(current_student, is_team_project, sparse_paths,
+                                                          [result.commit_id] if result.has_commit_id() else [], checkpoint, set_up_repos):
+                        failed_repos.add(repo_suffix)
+                finally:
+                    repos_ready[repo_suffix].set()
+
+            def work():
+                try:
+                    while True:
+                        item = parsed_submissions.get()
+                        if item == None:
+                            break
+                        if stop.is_set():
+                            continue
 
-                if whitelist == None:
-                    folders = os.listdir(submission_folder_name)
-                else:
-                    folders = self.get_student_folder_names_from_list(whitelist, is_team_project)
+                        t_square_id, current_student = item
+                        try:
+                            # clone repo if needed - set up a credential helper first, there's no prompt from worker threads
+                            setup_repo(current_student)
+                            with self.get_repo_lock(self.get_repo_suffix(current_student, is_team_project)):
+                                current_student = self.check_student_submission(current_student, assignment_alias, is_team_project, failed_repos)
+                            results.put((t_square_id, current_student, None))
+                        except Exception:
+                            results.put((t_square_id, current_student, sys.exc_info()))
+                finally:
+                    results.put(None)
+
+            threads = [threading.Thread(target=parse)] + [threading.Thread(target=work) for _ in range(worker_count)]
+            for thread in threads:
+                thread.daemon = True  # so Ctrl+C isn't held up by a worker
+                thread.start()
+
+            error = None
+            running_workers = worker_count
+            while running_workers > 0:
+                try:
+                    item = results.get(True, 1)  # with a timeout, so Ctrl+C still works while waiting
+                except Queue.Empty:
+                    continue
 
-                for folder in folders:
-                    # Check for hidden .DS_Store file in MacOS
-                    if str(folder) == ".DS_Store":
-                        continue
+                if item == None:
+                    running_workers -= 1
+                    continue
 
-                    parsed = folder.split('(')
-                    name = parsed[0]
-                    t_square_id = parsed[1].strip(')')
+                t_square_id, current_student, exc_info = item
+                if exc_info != None:
+                    if error == None:
+                        error = exc_info
+                        stop.set()
+                    continue
 
-                    try:
-                        current_student = students[t_square_id]
-                    except KeyError:  # also pulls in TAs, who won't be in students records file
-                        continue
+                # save info
+                self.evaluate_deadlines([(t_square_id, current_student)], assignment_alias, deadlines, is_team_project)
+                students[t_square_id] = current_student
+                graded.append((t_square_id, current_student))
+                with self.profile_stage('save records', current_student.gt_id):
+                    record_store.save_result(t_square_id, assignment_alias, current_student.results[assignment_alias])
+                    checkpoint.save(t_square_id, current_student.results[assignment_alias])
+
+            for thread in threads:
+                thread.join()
+
+            if error != None:
+                raise error[0], error[1], error[2]
+
+            if len(failed_repos) > 0:
+                print 'FAILED TO SET UP %s REPO(S): %s' % (len(failed_repos), ', '.join(sorted(failed_repos)))
+
+            self.finish_assignment(record_store, checkpoint, students, graded, graded_teams, assignment_alias, deadlines,
+                                   whitelist, is_team_project, failed_repos, sparse_paths, autograde_command, similarity_threshold,
+                                   saved=True)
+
+        finally:
+            self.close_run(record_store, checkpoint, {'function': 'prep_repos_async', 'assignment': assignment_alias,
+                                                      'deadline': deadline, 'is_team_project': is_team_project,
+                                                      'max_workers': self.max_workers})
+
+    def resume_checkpoint(self, checkpoint, assignment_alias):
+        # (t_square_id -> result, repo suffixes set up) from an interrupted run, if resume is on
+        finished = checkpoint.load_finished() if self.resume else {}
+        set_up_repos = checkpoint.load_set_up_repos() if self.resume else set()
+        if len(finished) > 0 or len(set_up_repos) > 0:
+            print 'Resuming %s: %s students and %s repos already done' % (assignment_alias, len(finished), len(set_up_repos))
+        checkpoint.start(finished, set_up_repos)
+
+        return finished, set_up_repos
+
+    def finish_assignment(self, record_store, checkpoint, students, graded, graded_teams, assignment_alias, deadlines, whitelist,
+                          is_team_project, failed_repos, sparse_paths, autograde_command, similarity_threshold, saved=False):
+        # everything prep_repos and prep_repos_async do once every student's commit is checked. saved: the results were
+        # already saved one at a time, so only the stages below can have changed them
+        if self.find_fallback_commits:
+            self.resolve_fallback_commits(graded, assignment_alias, deadlines, is_team_project)
+
+        # builds only start once every commit is known, so a team's most recent commit is the one built
+        if autograde_command != None:
+            self.autograde(graded, assignment_alias, autograde_command, is_team_project, failed_repos)
+
+        if similarity_threshold != None:
+            self.find_similar_submissions(graded, assignment_alias, similarity_threshold, is_team_project, sparse_paths)
+
+        # save info
+        with self.profile_stage('save records'):
+            if not saved or self.find_fallback_commits or autograde_command != None or similarity_threshold != None:
+                for t_square_id, current_student in graded:
+                    record_store.save_result(t_square_id, assignment_alias, current_student.results[assignment_alias])
+            record_store.flush()
+        checkpoint.finish()
+        self.mark_graded_repos_used(graded, is_team_project)
+
+        # check out most recent commit, once per team
+        if is_team_project and self.checkout_commits:
+            self.checkout_team_commits(whitelist if whitelist != None else sorted(graded_teams), students, assignment_alias)
+
+        if self._prepared_repos == None:  # prep_term manages the workspace once every assignment is done
+            self.manage_workspace()
+
+    def close_run(self, record_store, checkpoint, run_info):
+        self.finish_profiling(run_info)
+        checkpoint.close()
+        record_store.close()
+        self.close_git_repos()
+        self.close_submission_files()
+
+    def load_students(self, record_store, assignment_alias, caller):
+        # only a missing or empty record store means create_student_json hasn't been run; IOErrors from later on are
+        # left alone so their own message gets through
+        try:
+            with self.profile_stage('roster load'):
+                students = record_store.load_students(assignment_alias)
+        except IOError:
+            students = {}
+        if len(students) == 0:
+            raise IOError('%s couldn\'t find student records file. Run create_student_json first.' % caller)
 
-                    if (whitelist != None and not is_team_project and current_student['gt_id'] not in whitelist) or (whitelist != None and is_team_project and teams[current_student['gt_id']] not in whitelist):
-                        continue
+        return students
 
-                    # reset info for current assignment
-                    current_student[assignment_alias] = {}
+    def prep_term(self, manifest):
+        # manifest: one dict of prep_repos arguments per assignment (submission_folder_name, deadline, whitelist,
+        # is_team_project, ...). Every repo is cloned/pulled once up front and each assignment is checked against that
+        # copy; a sparse repo gets every folder any of its assignments needs.
+        self.start_profiling()
+        try:
+            store = self.open_record_store()
+            try:
+                with self.profile_stage('roster load'):
+                    students = store.load_students()
+            finally:
+                store.close()
 
-                    # get submission text
-                    current_student = self.check_submission_file(current_student, t_square_id, submission_folder_name, folder, assignment_alias)
+            repo_students = {}  # repo suffix -> (record, is_team_project) for every repo any assignment needs
+            repo_sparse_paths = {}  # repo suffix -> folders its assignments need, or None for the whole repo
+            try:
+                for entry in manifest:
+                    is_team_project = entry.get('is_team_project', False)
+                    submission_files = self.get_submission_files(entry['submission_folder_name'])
+                    for t_square_id, folder, current_student in self.get_student_folders(submission_files, students, entry.get('whitelist'), is_team_project):
+                        repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+                        repo_students.setdefault(repo_suffix, (current_student, is_team_project))
+                        if entry.get('sparse_paths') == None:
+                            repo_sparse_paths[repo_suffix] = None
+                        elif repo_sparse_paths.get(repo_suffix, []) != None:
+                            repo_sparse_paths[repo_suffix] = sorted(set(repo_sparse_paths.get(repo_suffix, [])) | set(entry['sparse_paths']))
+            finally:
+                self.close_submission_files()
+
+            if not os.path.isdir("Repos"):
+                os.makedirs("Repos")
+
+            if self.reference_repo_url != None:
+                self.setup_reference_repo()
+
+            def setup(repo_suffix):
+                current_student, is_team_project = repo_students[repo_suffix]
+                return repo_suffix, self.setup_student_repo_safely(current_student, is_team_project, repo_sparse_paths[repo_suffix])
+
+            checkout_commits = self.checkout_commits
+            reference_repo_url = self.reference_repo_url
+            self.checkout_commits = False  # one working tree can't hold every assignment; use checkout_submission
+            try:
+                # clone repos if needed - note that you'll need to authenticate with github here; debugger may not work properly
+                self._prepared_repos = dict(self.map_in_pool(setup, sorted(repo_students.keys())))
+
+                failed_repos = sorted([repo_suffix for repo_suffix, succeeded in self._prepared_repos.items() if not succeeded])
+                if len(failed_repos) > 0:
+                    print 'FAILED TO SET UP %s REPO(S): %s' % (len(failed_repos), ', '.join(failed_repos))
+
+                self.reference_repo_url = None  # already fetched above
+                for entry in manifest:
+                    print 'Preparing %s' % entry['submission_folder_name']
+                    self.prep_repos(**entry)
+            finally:
+                self.checkout_commits = checkout_commits
+                self.reference_repo_url = reference_repo_url
+                self._prepared_repos = None
+
+            self.manage_workspace()
+        finally:
+            self.finish_profiling({'function': 'prep_term', 'max_workers': self.max_workers,
+                                   'assignments': [entry['submission_folder_name'] for entry in manifest]})
+
+    def keep_repos_warm(self, interval=15 * 60, rounds=None):
+        # fetches every student and team repo on the roster every interval seconds, until Ctrl+C or after rounds rounds.
+        # Run it in its own process ahead of a deadline; prep_repos with warm_cache_max_age set then skips the pulls.
+        if not os.path.isdir("Repos"):
+            os.makedirs("Repos")
 
-                    # get t-square timestamp
-                    current_student = self.check_timestamp_file(current_student, submission_folder_name, folder, assignment_alias)
+        round_number = 0
+        while rounds == None or round_number < rounds:
+            started = time.time()
+            repo_suffixes = self.get_roster_repo_suffixes()
+            results = self.map_in_pool(self.warm_repo, repo_suffixes)
+            print 'Fetched %s of %s repos in %.0f s' % (results.count(True), len(repo_suffixes), time.time() - started)
 
-                    # clone repo if needed - note that you'll need to authenticate with github here; debugger may not work properly
-                    self.setup_student_repo(current_student, is_team_project)
+            round_number += 1
+            if rounds == None or round_number < rounds:
+                time.sleep(max(0, interval - (time.time() - started)))
 
-                    # only check commit ID validity and GitHub timestamp on valid commits
-                    if self.commit_id_present(current_student[assignment_alias]['commitID']):
-                        # try to check out commit ID
-                        current_student = self.check_commit_ID(current_student, assignment_alias, is_team_project)
+    def get_roster_repo_suffixes(self):
+        student_roster = self.get_roster()
+        repo_suffixes = sorted(student_roster.get_gt_ids())
+        try:
+            repo_suffixes += student_roster.get_teams()
+        except IOError:
+            pass  # no team files yet, so there are no team repos to fetch
 
-                        current_student = self.check_timestamp_github(current_student, assignment_alias, deadline, is_team_project)
+        return repo_suffixes
 
-                    # check T-Square timestamp against deadline
-                    current_student = self.check_timestamp_t_square(current_student, assignment_alias, deadline)
+    def warm_repo(self, repo_suffix):
+        # only objects and remote refs are updated, so a prep_repos run working in the same repo isn't disturbed
+        self.wait_for_fetch_slot()
+        fetched_at = time.time()
+        try:
+            if not os.path.isdir(self.get_repo_path(repo_suffix)):
+                self.clone_repo(repo_suffix, checkout=False)  # setup_student_repo checks it out, sparse or not
+            else:
+                self.run_git(repo_suffix, ['fetch', '--quiet'])
+        except subprocess.CalledProcessError, e:
+            print '%s couldn\'t be fetched: %s' % (repo_suffix, e)
+            return False
 
-                    # save info
-                    students[t_square_id] = current_student
+        with self._lock:
+            self.get_warm_cache()[repo_suffix] = {'fetched_at': fetched_at}
+            self.save_warm_cache()
 
-            if students != None:
-                # save info
-                with open(self.student_records_filename, 'w') as output_file:
-                    json.dump(students, output_file)
-
-            # check out most recent commit
-            if is_team_project and whitelist != None:
-                teams = self.get_dictionary_from_json_file(self.team_members_filename)
-                aliases = self.get_dictionary_from_json_file(self.student_alias_filename)
-                for team in whitelist:
-                    members = teams[team]
-                    commits = []
-                    for student in members:
-                        t_square_id = aliases[student]
-                        student_info = students[t_square_id]
+        return True
 
-                        try:
-                            commit_time = student_info[assignment_alias]['Timestamp GitHub']
-                            commit_ID = student_info[assignment_alias]['commitID']
-                        except KeyError:
-                            continue
+    def wait_for_fetch_slot(self):
+        with self._lock:
+            now = time.time()
+            wait = max(0, self._next_fetch_time - now)
+            self._next_fetch_time = max(now, self._next_fetch_time) + 60.0 / self.warm_fetches_per_minute
 
-                        if self.commit_id_present(commit_ID) and commit_time != 'N/A':
-                            commits.append((commit_time, commit_ID))
+        time.sleep(wait)
 
-                    commits.sort(reverse=True) # most recent should be first
-                    try:
-                        most_recent_commit_time, most_recent_commit = commits[0]
-                    except IndexError:
-                        most_recent_commit = "None"
-                        most_recent_commit_time = "None"
+    def get_warm_cache(self):
+        try:
+            mtime = os.path.getmtime(self.warm_cache_filename)
+        except OSError:
+            return self._warm_cache  # nothing fetched yet
+
+        if mtime != self._warm_cache_mtime:
+            with open(self.warm_cache_filename, 'r') as warm_cache_file:
+                self._warm_cache = json.load(warm_cache_file)
+            self._warm_cache_mtime = mtime
+
+        return self._warm_cache
+
+    def save_warm_cache(self):
+        # write a new file and move it into place, so prep_repos never reads a half-written one
+        temp_filename = self.warm_cache_filename + '.tmp'
+        with open(temp_filename, 'w') as warm_cache_file:
+            json.dump(self._warm_cache, warm_cache_file)
+        if platform.system() == 'Windows' and os.path.isfile(self.warm_cache_filename):
+            os.remove(self.warm_cache_filename)  # windows can't rename over an existing file
+        os.rename(temp_filename, self.warm_cache_filename)
+        self._warm_cache_mtime = os.path.getmtime(self.warm_cache_filename)
+
+    def is_repo_warm(self, repo_suffix):
+        if self.warm_cache_max_age == None:
+            return False
+
+        with self._lock:
+            fetched = self.get_warm_cache().get(repo_suffix)
+
+        return fetched != None and time.time() - fetched['fetched_at'] <= self.warm_cache_max_age and \
+            os.path.isdir(self.get_repo_path(repo_suffix))
+
+    def get_student_folders(self, submission_files, students, whitelist=None, is_team_project=False):
+        # (t_square_id, folder, record) for every student submission to grade
+        if whitelist == None:
+            folders = submission_files.list_folders()
+        else:
+            folders = self.get_student_folder_names_from_list(whitelist, is_team_project)
+            whitelisted = set(whitelist)
 
-                    # checkout most recent commit here
-                    if len(commits) > 0:
-                        try:
-                            command_checkout = "cd Repos/%s%s; git checkout %s;" % (self.folder_prefix, team, most_recent_commit)
-                            output_checkout = self.get_command_output(command_checkout)
-                        except subprocess.CalledProcessError:
-                            raise subprocess.CalledProcessError
-                    else:
-                        print 'NO VALID COMMITS FOR %s!' % team
-                    pass
+        student_roster = self.get_roster()
+        for folder in folders:
+            # Check for hidden .DS_Store file in MacOS
+            if str(folder) == ".DS_Store":
+                continue
+
+            parsed = folder.split('(')
+            name = parsed[0]
+            t_square_id = parsed[1].strip(')')
+
+            try:
+                current_student = students[t_square_id]
+            except KeyError:  # also pulls in TAs, who won't be in students records file
+                continue
+
+            if (whitelist != None and not is_team_project and current_student.gt_id not in whitelisted) or (whitelist != None and is_team_project and student_roster.get_team(current_student.gt_id) not in whitelisted):
+                continue
+
+            yield t_square_id, folder, current_student
+
+    def check_student_submission(self, current_student, assignment_alias, is_team_project=False, failed_repos=()):
+        # only check commit ID validity and GitHub timestamp on valid commits
+        if current_student.results[assignment_alias].has_commit_id():
+            repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+            if repo_suffix in failed_repos and not os.path.isdir(self.get_repo_path(repo_suffix)):
+                current_student.results[assignment_alias].commit_id_valid = False  # nothing to check against
+            else:
+                # try to check out commit ID
+                current_student = self.check_commit_ID(current_student, assignment_alias, is_team_project)
+
+            current_student = self.check_timestamp_github(current_student, assignment_alias, is_team_project)
 
+        return current_student
+
+    def resolve_team_commits(self, team_members, assignment_alias):
+        # one batched lookup per team repo for every member's commit; check_commit_ID and check_timestamp_github then
+        # read the results from the git_backend cache
+        commit_IDs = {}  # team -> submitted commit IDs
+        for t_square_id, current_student in team_members:
+            if current_student.results[assignment_alias].has_commit_id():
+                team = self.get_repo_suffix(current_student, True)
+                commit_IDs.setdefault(team, []).append(current_student.results[assignment_alias].commit_id)
+
+        for team, team_commit_IDs in sorted(commit_IDs.items()):
+            if os.path.isdir(self.get_repo_path(team)):
+                with self.profile_stage('commit lookup', team):
+                    self.get_git_repo(team).get_commits(team_commit_IDs)
+
+    def checkout_team_commits(self, teams, students, assignment_alias):
+        for team in teams:
+            most_recent_commit = self.get_most_recent_team_commit(team, students, assignment_alias)
+
+            # checkout most recent commit here
+            if most_recent_commit != None:
+                try:
+                    with self.profile_stage('checkout', team):
+                        output_checkout = self.run_git(team, ['checkout', most_recent_commit])
+                except subprocess.CalledProcessError, e:
+                    print '%s couldn\'t check out %s: %s' % (team, most_recent_commit, e)
+            else:
+                print 'NO VALID COMMITS FOR %s!' % team
+
+    def get_most_recent_team_commit(self, team, students, assignment_alias):
+        student_roster = self.get_roster()
+
+        commits = []
+        for student in student_roster.get_members(team):
+            t_square_id = student_roster.get_t_square_id(student)
+            result = students[t_square_id].results.get(assignment_alias)
+
+            if result != None and result.has_commit_id() and result.epoch_github != None:
+                commits.append((result.epoch_github, result.commit_id))
+
+        if len(commits) == 0:
+            return None
+
+        commits.sort(reverse=True)  # most recent should be first
+        most_recent_commit_time, most_recent_commit = commits[0]
+
+        return most_recent_commit
+
+    def checkout_submission(self, student, assignment_alias, is_team_project=False):
+        # check out a graded submission on demand, e.g. after running prep_repos with checkout_commits = False
+        store = self.open_record_store()
+        try:
+            if is_team_project:
+                commit_ID = self.get_most_recent_team_commit(student, store.load_students(assignment_alias), assignment_alias)
+            else:
+                result = store.get_result(self.get_roster().get_t_square_id(student), assignment_alias)
+                commit_ID = result.commit_id if result != None and result.commit_id_valid else None
         except IOError:
-            raise IOError('prep_repos couldn\'t find student records file. Run create_student_json first.')
+            raise IOError('checkout_submission couldn\'t find student records file. Run create_student_json first.')
+        finally:
+            store.close()
 
-    def get_student_team(self, student_gt_id):
-        teams = self.get_dictionary_from_json_file(self.team_records_filename)
+        if commit_ID == None:
+            print 'NO VALID COMMITS FOR %s!' % student
+            return None
+
+        self.rehydrate_repo(student)
+        # repos are named after the student's GT ID or the team; --force, as prep_repos doesn't reset them without checkout_commits
+        self.run_git(student, ['checkout', '--force', commit_ID])
 
+        return self.get_repo_path(student)
+
+    def get_student_team(self, student_gt_id):
         try:
-            team = teams[student_gt_id]
-        except IndexError:
+            team = self.get_roster().get_team(student_gt_id)
+        except KeyError:
             raise IndexError('Couldn\'t find team for student with GTID %s' % student_gt_id)
 
         return team
 
+    def open_record_store(self):
+        return record_store.open_record_store(self.record_store, self.student_records_filename,
+                                              self.student_records_db_filename)
+
+    def open_checkpoint(self, assignment_alias, deadline, whitelist, is_team_project):
+        run_settings = {'assignment': assignment_alias, 'deadline': deadline, 'is_team_project': is_team_project,
+                        'whitelist': None if whitelist == None else sorted(whitelist)}
+
+        return record_store.RunCheckpoint(self.checkpoint_filename, run_settings)
+
+    def import_student_records(self, file_name):
+        # load a student_records.json-style file into the current record store
+        with open(file_name, 'r') as records_file:
+            students = json.load(records_file)
+
+        store = self.open_record_store()
+        try:
+            store.import_records(students)
+        finally:
+            store.close()
+
+    def export_student_records(self, file_name):
+        # write the current record store out in the student_records.json format
+        store = self.open_record_store()
+        try:
+            students = store.export_records()
+        finally:
+            store.close()
+
+        with open(file_name, 'w') as output_file:
+            json.dump(students, output_file)
+
+    def get_roster(self):
+        if self._roster == None:
+            self._roster = roster.Roster(self.student_records_filename, self.student_alias_filename,
+                                         self.team_records_filename, self.team_members_filename)
+
+        return self._roster
+
+    def forget_roster(self):
+        for file_name in [self.student_records_filename, self.student_alias_filename,
+                          self.team_records_filename, self.team_members_filename]:
+            roster.forget_json_file(file_name)
+        self._roster = None
+
     def get_dictionary_from_json_file(self, file_name):
         info = {}
-        if file_name not in self._temp.keys():
-            try:
-                with open(file_name, 'r') as my_file:
-                    info = json.load(my_file)
-                    self._temp[file_name] = info
-            except IOError:
-                print 'Couldn\'t open file with name %s' % file_name
-        else:
-            info = self._temp[file_name]
+        try:
+            info = roster.load_json_file(file_name)
+        except IOError:
+            print 'Couldn\'t open file with name %s' % file_name
 
         return info
 
+    def get_submission_files(self, submission_folder_name):
+        if submission_folder_name not in self._submission_files:
+            self._submission_files[submission_folder_name] = submission_parser.open_submissions(submission_folder_name)
+
+        return self._submission_files[submission_folder_name]
+
+    def close_submission_files(self):
+        for submission_files in self._submission_files.values():
+            submission_files.close()
+        self._submission_files = {}
+
     def get_assignment_alias(self, submission_folder_name):
+        if submission_folder_name.lower().endswith('.zip'):
+            return self.get_submission_files(submission_folder_name).assignment_alias
+
         return submission_folder_name.split('/')[len(submission_folder_name.split('/')) - 1]
 
     def get_student_folder_names_from_list(self, whitelist, is_team_project):
         folders = []
+        student_roster = self.get_roster()
         if is_team_project:
-            teams = self.get_dictionary_from_json_file(self.team_members_filename)
             whitelist_teams = []
             for team in whitelist:
-                group = teams[team]
+                group = student_roster.get_members(team)
                 whitelist_teams += group
             whitelist = whitelist_teams  # now contains student GTIDs instead of just team names
 
-        t_square_aliases = self.get_dictionary_from_json_file(self.student_alias_filename)
-        student_info = self.get_dictionary_from_json_file(self.student_records_filename)
-
         for student in whitelist:
             try:
-                t_square_id = t_square_aliases[student]
-                name = student_info[t_square_id]['name']
-            except IndexError:
+                folders.append(student_roster.get_folder_name(student))
+            except KeyError:
                 print 'Couldn\'t get folder name for student with GTID %s' % student
 
-            folder_name = "%s(%s)" % (name, t_square_id)
-            folders.append(folder_name)
-
         return folders
 
+    def read_submission(self, current_student, t_square_id, submission_folder_name, folder, assignment_alias):
+        with self.profile_stage('submission parse', current_student.gt_id):
+            # reset info for current assignment
+            current_student.results[assignment_alias] = records.SubmissionResult()
+
+            # get submission text
+            current_student = self.check_submission_file(current_student, t_square_id, submission_folder_name, folder, assignment_alias)
+
+            # get t-square timestamp
+            current_student = self.check_timestamp_file(current_student, submission_folder_name, folder, assignment_alias)
+
+        return current_student
+
+    def get_submission_mtime(self, submission_folder_name, folder):
+        return self.get_submission_files(submission_folder_name).get_mtime(folder)
+
     def check_submission_file(self, current_student, t_square_id, submission_folder_name, folder, assignment_alias):
         try:
-            submission_file = "%s(%s)_submissionText.html" % (current_student['name'], t_square_id)
-            with open(os.path.join(submission_folder_name, folder, submission_file), 'r') as submission_info:
-                strings = re.findall(r'([0-9A-Za-z]{40})', submission_info.read())
-                if len(strings) == 0:
-                    current_student[assignment_alias]['commitID'] = "Invalid"
-                else:
-                    current_student[assignment_alias]['commitID'] = strings[0]  # tiebreak: use first in list
+            submission_file = "%s(%s)%s" % (current_student.name, t_square_id, submission_parser.SUBMISSION_TEXT_SUFFIX)
+            with self.get_submission_files(submission_folder_name).open(folder, submission_file) as submission_info:
+                commit_ID = submission_parser.find_commit_id(submission_info)
+            if commit_ID == None:
+                current_student.results[assignment_alias].commit_status = records.INVALID
+            else:
+                current_student.results[assignment_alias].commit_id = commit_ID  # tiebreak: use first in file
         except IOError:
-            current_student[assignment_alias]['commitID'] = "Missing"
+            current_student.results[assignment_alias].commit_status = records.MISSING
 
         return current_student
 
     def check_timestamp_file(self, current_student, submission_folder_name, folder, assignment_alias):
         try:
-            timestamp_file = "timestamp.txt"
-            with open(os.path.join(submission_folder_name, folder, timestamp_file), 'r') as timestamp_info:
-                timestamp = timestamp_info.read()
-                current_student[assignment_alias]['Timestamp T-Square'] = timestamp
+            timestamp_file = submission_parser.TIMESTAMP_FILE
+            with self.get_submission_files(submission_folder_name).open(folder, timestamp_file) as timestamp_info:
+                current_student.results[assignment_alias].epoch_t_square = self.get_t_square_epoch(timestamp_info.read())
         except IOError:
-            current_student[assignment_alias]['Timestamp T-Square'] = "Missing"
-            current_student[assignment_alias]['commitID'] = "Missing"
+            current_student.results[assignment_alias].epoch_t_square = None
+            current_student.results[assignment_alias].set_commit_id("Missing")
         return current_student
 
-    def setup_student_repo(self, current_student, is_team_project=False):
+    def get_repo_suffix(self, current_student, is_team_project=False):
         if is_team_project:
-            repo_suffix = self.get_student_team(current_student['gt_id'])
-        else:
-            repo_suffix = current_student['gt_id']
+            return self.get_student_team(current_student.gt_id)
+
+        return current_student.gt_id
+
+    def get_repo_path(self, repo_suffix):
+        return os.path.join("Repos", "%s%s" % (self.folder_prefix, repo_suffix))
+
+    def get_repo_url(self, repo_suffix):
+        return "%s/%s/%s%s.git" % (self.git_host, self.git_context, self.folder_prefix, repo_suffix)
+
+    def load_repo_state(self):
+        try:
+            with open(self.repo_state_filename, 'r') as repo_state_file:
+                return json.load(repo_state_file)
+        except IOError:
+            return {}  # first incremental run
+
+    def save_repo_state(self):
+        with open(self.repo_state_filename, 'w') as repo_state_file:
+            json.dump(self._repo_state, repo_state_file)
+
+    def get_repo_state(self, repo_suffix):
+        repo_name = "%s%s" % (self.folder_prefix, repo_suffix)
+        if repo_name not in self._repo_state:
+            self._repo_state[repo_name] = {'fetched_refs': None, 'submissions': {}}
+
+        return self._repo_state[repo_name]
+
+    def get_cached_result(self, current_student, t_square_id, assignment_alias, submission_mtime, is_team_project=False):
+        repo_state = self.get_repo_state(self.get_repo_suffix(current_student, is_team_project))
+        try:
+            cached = repo_state['submissions'][assignment_alias][t_square_id]
+        except KeyError:
+            return None
+
+        if cached['mtime'] != submission_mtime:
+            return None
+
+        return records.SubmissionResult.from_dict(cached['result'])
+
+    def get_remote_refs(self, repo_suffixes):
+        # repo suffix -> digest of every branch and tag on the remote, so a push to any of them counts as a change
+        def get_remote_ref(repo_suffix):
+            if not self.pull_from_github:
+                return repo_suffix, self.get_repo_state(repo_suffix).get('fetched_refs')  # nothing new will be pulled
+
+            try:
+                with self.profile_stage('remote ref check', repo_suffix):
+                    output = self.check_output(['git', 'ls-remote', self.get_repo_url(repo_suffix)])
+            except subprocess.CalledProcessError:
+                return repo_suffix, None
+            return repo_suffix, hashlib.sha1(output).hexdigest() if output.strip() != '' else None
+
+        return dict(self.map_in_pool(get_remote_ref, sorted(repo_suffixes)))
+
+    def is_repo_up_to_date(self, repo_suffix):
+        remote_refs = self._remote_refs.get(repo_suffix)
+
+        return remote_refs != None and remote_refs == self.get_repo_state(repo_suffix).get('fetched_refs') and \
+            os.path.isdir(self.get_repo_path(repo_suffix))
+
+    def checkout_cached_commit(self, current_student, cached_result):
+        # another assignment's run may have moved the repo since this result was cached
+        repo_suffix = self.get_repo_suffix(current_student)
+        if not self.checkout_commits or not cached_result.commit_id_valid:
+            return
+        if self.workspace_budget != None:
+            self.rehydrate_repo(repo_suffix)  # a compacted repo still has the commit as HEAD, but no files
+        if self.get_detached_head(repo_suffix) == cached_result.commit_id:
+            return
+
+        try:
+            with self.profile_stage('checkout', repo_suffix):
+                self.run_git(repo_suffix, ['checkout', cached_result.commit_id])
+        except subprocess.CalledProcessError, e:
+            print '%s couldn\'t check out %s: %s' % (current_student.gt_id, cached_result.commit_id, e)
+
+    def update_repo_state(self, processed_students, failed_repos, submission_mtimes, assignment_alias, is_team_project=False):
+        for t_square_id, current_student in processed_students:
+            repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+            if repo_suffix in failed_repos:
+                continue  # try again next time
+
+            repo_state = self.get_repo_state(repo_suffix)
+            if self.pull_from_github and self._remote_refs.get(repo_suffix) != None:
+                repo_state['fetched_refs'] = self._remote_refs[repo_suffix]
+
+            assignments = repo_state['submissions'].setdefault(assignment_alias, {})
+            assignments[t_square_id] = {'mtime': submission_mtimes[t_square_id], 'result': current_student.results[assignment_alias].to_dict()}
+
+    def map_in_pool(self, function, items, max_workers=None):
+        max_workers = self.max_workers if max_workers == None else max_workers
+        if max_workers > 1 and len(items) > 1:
+            pool = ThreadPool(min(max_workers, len(items)))
+            try:
+                return pool.map(function, items)
+            finally:
+                pool.close()
+                pool.join()
+
+        return [function(item) for item in items]
+
+    def setup_student_repos(self, current_students, is_team_project=False, sparse_paths=None, assignment_alias=None,
+                            checkpoint=None, set_up_repos=()):
+        # one student per repo; team members share a repo, so only set it up once
+        repo_students = {}
+        commit_IDs = {}  # repo suffix -> submitted commit IDs, which have to be in the repo to skip its fetch
+        for current_student in current_students:
+            repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+            if repo_suffix not in repo_students:
+                repo_students[repo_suffix] = current_student
+            result = current_student.results.get(assignment_alias)
+            if result != None and result.has_commit_id():
+                commit_IDs.setdefault(repo_suffix, []).append(result.commit_id)
+
+        def setup(repo_suffix):
+            if self._prepared_repos != None and repo_suffix in self._prepared_repos and \
+                    (not self._prepared_repos[repo_suffix] or self.has_commits(repo_suffix, commit_IDs.get(repo_suffix, []))):
+                return repo_suffix, self._prepared_repos[repo_suffix]  # prep_term already cloned/pulled it
+
+            return repo_suffix, self.setup_student_repo_safely(repo_students[repo_suffix], is_team_project, sparse_paths,
+                                                               commit_IDs.get(repo_suffix, []), checkpoint, set_up_repos)
+
+        results = self.map_in_pool(setup, sorted(repo_students.keys()))
+
+        failed_repos = [repo_suffix for repo_suffix, succeeded in results if not succeeded]
+        if len(failed_repos) > 0:
+            print 'FAILED TO SET UP %s REPO(S): %s' % (len(failed_repos), ', '.join(failed_repos))
+
+        return set(failed_repos)
+
+    def setup_student_repo_safely(self, current_student, is_team_project=False, sparse_paths=None, commit_IDs=(),
+                                  checkpoint=None, set_up_repos=()):
+        # a clone that fails shouldn't stop the rest of the class from being processed. Each repo set up is saved to
+        # checkpoint, and a resumed run passes those as set_up_repos so they aren't cloned/pulled again.
+        repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+        if repo_suffix in set_up_repos and os.path.isdir(self.get_repo_path(repo_suffix)) and self.has_commits(repo_suffix, commit_IDs):
+            return True  # checkpoint.start already saved it again
+
+        try:
+            succeeded = self.setup_student_repo(current_student, is_team_project, sparse_paths, commit_IDs)
+        except subprocess.CalledProcessError, e:
+            print '%s subprocess.CalledProcessError: %s' % (repo_suffix, e)
+            return False
+
+        if succeeded and checkpoint != None:
+            checkpoint.save_repo(repo_suffix)
+        return succeeded
+
+    def setup_student_repo(self, current_student, is_team_project=False, sparse_paths=None, commit_IDs=()):
+        # commit_IDs: the submitted commits; if any isn't in the repo yet, it's fetched even if it otherwise wouldn't be
+        repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+        self.mark_repo_used(repo_suffix)
 
         if not os.path.isdir("./Repos/%s%s" % (self.folder_prefix, repo_suffix)):
-            command = "cd Repos; git clone https://github.gatech.edu/%s/%s%s.git; cd .." % (
-            self.git_context, self.folder_prefix, repo_suffix)
-            output = self.get_command_output(command)
+            with self.profile_stage('clone', repo_suffix) as stage:
+                # sparse repos are checked out below; without checkout_commits, checkout_submission writes the files
+                output = self.clone_repo(repo_suffix, checkout=sparse_paths == None and self.checkout_commits)
+                self.add_bytes_fetched(stage, repo_suffix, 0)
 
             if is_team_project:
-                self._pulled_teams.append(repo_suffix)  # just do this once
+                self._pulled_teams.add(repo_suffix)  # just do this once
 
             just_cloned_repo = True
         else:
             just_cloned_repo = False
 
-        # revert any local changes and pull from remote
+        # revert any local changes and pull from remote; only the objects and refs are updated without checkout_commits
         try:
-                command_setup = "cd Repos/%s%s && git clean -fd && git reset --hard HEAD && git checkout .;" % (
-                self.folder_prefix, repo_suffix)
-
-                if self.pull_from_github and (not self.has_pulled_repo_for_team(is_team_project, repo_suffix) or just_cloned_repo):
-                    command_setup += "git pull;"
-
-                output_clear = self.get_command_output(command_setup)
+                if sparse_paths != None or self.is_sparse_repo(repo_suffix):
+                    with self.profile_stage('sparse checkout', repo_suffix):
+                        self.set_sparse_paths(repo_suffix, sparse_paths)
+
+                if self.checkout_commits:
+                    with self.profile_stage('reset', repo_suffix):
+                        self.run_git(repo_suffix, ['clean', '-fd'])
+                        self.run_git(repo_suffix, ['reset', '--hard', 'HEAD'])
+
+                already_fetched = (self.incremental and self.is_repo_up_to_date(repo_suffix)) or self.is_repo_warm(repo_suffix)
+                if self.pull_from_github and ((not already_fetched and (not self.has_pulled_repo_for_team(is_team_project, repo_suffix) or just_cloned_repo))
+                                              or not self.has_commits(repo_suffix, commit_IDs)):
+                    with self.profile_stage('fetch', repo_suffix) as stage:
+                        size_before = self.get_object_size(stage, repo_suffix)
+                        self.pull_repo(repo_suffix)
+                        self.add_bytes_fetched(stage, repo_suffix, size_before)
+                    self.forget_git_repo(repo_suffix)  # commits looked up before the fetch may be there now
         except subprocess.CalledProcessError, e:
-            print '%s subprocess.CalledProcessError:' % (current_student['gt_id'])
+            print '%s subprocess.CalledProcessError:' % (current_student.gt_id)
             try:
                 print str(e.output)
             except UnicodeDecodeError:
                 print 'UnicodeDecodeError'
+            return False
 
-    def check_timestamp_github(self, current_student, assignment_alias, deadline, is_team_project=False):
-        if not current_student[assignment_alias]['commitID valid']:
-            current_student[assignment_alias]['Submission GitHub'] = 'N/A'
-            current_student[assignment_alias]['Timestamp GitHub'] = 'N/A'
-        else:
-            if is_team_project:
-                repo_suffix = self.get_student_team(current_student['gt_id'])
-            else:
-                repo_suffix = current_student['gt_id']
-
-            # check timestamp of GitHub commit
-            command_timestamp = "cd Repos/" + self.folder_prefix + repo_suffix + "; git show -s --format=%ci " + \
-                                current_student[assignment_alias]['commitID'] + "; cd -"
-            output_timestamp = self.get_command_output(command_timestamp)
-
-            timestamp_full = output_timestamp.split('/')[0].split(' ')
-            timestamp_github_raw = (timestamp_full[0] + " " + timestamp_full[1])
-            timezone_raw = timestamp_full[2].strip()
-            timezone = int(int(timezone_raw) * -1) / 100
-
-            dt_object = datetime.datetime.strptime(timestamp_github_raw, self.datetime_format)
-            dt_final = dt_object + datetime.timedelta(hours=timezone)
-            timestamp_github = dt_final.strftime(self.datetime_format)
-
-            # check GitHub timestamp against deadline
-            current_student[assignment_alias]['Timestamp GitHub'] = timestamp_github
-            if timestamp_github < deadline:
-                current_student[assignment_alias]['Submission GitHub'] = 'ok'
-            else:
-                current_student[assignment_alias]['Submission GitHub'] = 'late'
+        return True
 
-        return current_student
+    def clone_repo(self, repo_suffix, checkout=True):
+        options = self.get_clone_options() + ([] if checkout else ['--no-checkout'])
+        return self.check_output(['git', 'clone'] + options + [self.get_repo_url(repo_suffix)], cwd="Repos")
 
-    def check_timestamp_t_square(self, current_student, assignment_alias, deadline):
-        if current_student[assignment_alias]['Timestamp T-Square'] != 'Missing':
-            temp = current_student[assignment_alias]['Timestamp T-Square']
-            timestamp_t_square = temp[0:4] + '-' + temp[4:6] + '-' + temp[6:8] + ' ' \
-                                 + temp[8:10] + ':' + temp[10:12] + ':' + temp[12:14]
-            current_student[assignment_alias]['Timestamp T-Square'] = timestamp_t_square
-            if timestamp_t_square <= deadline:
-                current_student[assignment_alias]['Submission T-Square'] = 'ok'
-            else:
-                current_student[assignment_alias]['Submission T-Square'] = 'late'
+    def is_sparse_repo(self, repo_suffix):
+        return os.path.isfile(os.path.join(self.get_repo_path(repo_suffix), '.git', 'info', 'sparse-checkout'))
 
-        return current_student
+    def set_sparse_paths(self, repo_suffix, sparse_paths):
+        # checkouts (and the reset and pull in setup_student_repo) only write these folders from then on;
+        # None puts the whole working tree back (even without checkout_commits, as git has to clear its skip-worktree flags)
+        if sparse_paths != None and not self.checkout_commits:
+            self.write_sparse_settings(repo_suffix, sparse_paths)
+        elif sparse_paths != None:
+            self.run_git(repo_suffix, ['sparse-checkout', 'set'] + list(sparse_paths))
+        else:
+            self.run_git(repo_suffix, ['sparse-checkout', 'disable'])
+            os.remove(os.path.join(self.get_repo_path(repo_suffix), '.git', 'info', 'sparse-checkout'))
+
+    def write_sparse_settings(self, repo_suffix, sparse_paths):
+        # what 'git sparse-checkout set' would configure, without it writing the working tree; the next
+        # checkout_submission then only writes these folders
+        sparse_file_name = os.path.join(self.get_repo_path(repo_suffix), '.git', 'info', 'sparse-checkout')
+        self.run_git(repo_suffix, ['config', '--worktree', 'core.sparseCheckout', 'true'])
+        self.run_git(repo_suffix, ['config', '--worktree', 'core.sparseCheckoutCone', 'true'])
+
+        # cone mode: files at the top of the repo, each folder, and the files (not subfolders) of its parent folders
+        paths = sorted(set([path.strip('/') for path in sparse_paths]))
+        patterns = ['/*', '!/*/']
+        for path in [path for path in paths if not any([path.startswith(other + '/') for other in paths])]:
+            parts = path.split('/')
+            for depth in range(1, len(parts)):
+                parent = '/%s/' % '/'.join(parts[:depth])
+                if parent not in patterns:
+                    patterns += [parent, '!%s*/' % parent]
+            patterns.append('/%s/' % path)
+
+        if not os.path.isdir(os.path.dirname(sparse_file_name)):
+            os.makedirs(os.path.dirname(sparse_file_name))
+        with open(sparse_file_name, 'w') as sparse_file:
+            sparse_file.write('\n'.join(patterns) + '\n')
+
+    def mark_repo_used(self, repo_suffix):
+        with self._lock:
+            self._used_repos.add(os.path.basename(self.get_repo_path(repo_suffix)))
+
+    def mark_graded_repos_used(self, graded, is_team_project=False):
+        # repos resumed from the checkpoint or taken from the incremental cache are graded without being set up again
+        for t_square_id, current_student in graded:
+            self.mark_repo_used(self.get_repo_suffix(current_student, is_team_project))
+
+    def manage_workspace(self):
+        # records the size of every repo used since the last call, then, while Repos/ is over workspace_budget, compacts
+        # the least recently graded other repos (working tree removed, objects gc'd) and after that removes them.
+        # The next setup_student_repo puts a compacted repo's files back with its reset, and clones a removed one again.
+        with self._lock:
+            used_repos, self._used_repos = self._used_repos, set()
+        if self.workspace_budget == None or not os.path.isdir("Repos"):
+            return
+
+        with self.profile_stage('workspace'):
+            reference_repo_name = os.path.basename(os.path.normpath(self.reference_repo_path))
+            repo_names = [repo_name for repo_name in os.listdir("Repos") if os.path.isdir(os.path.join("Repos", repo_name))
+                          and repo_name != reference_repo_name]  # the reference repo is shared, so it's never removed
+
+            workspace_index = workspace.Workspace(self.workspace_filename)
+            workspace_index.forget_all_but(repo_names)
+            now = time.time()
+            for repo_name in repo_names:
+                if repo_name in used_repos or not workspace_index.has_repo(repo_name):
+                    # repos from before there was a workspace file count as the least recently used
+                    workspace_index.mark_used(repo_name, profiler.get_directory_size(os.path.join("Repos", repo_name)),
+                                              now if repo_name in used_repos else 0)
+
+            candidates = [repo_name for repo_name in workspace_index.get_least_recently_used() if repo_name not in used_repos]
+            compacted = []
+            removed = []
+            for repo_name in candidates:
+                if workspace_index.get_total_size() <= self.workspace_budget:
+                    break
+                if workspace_index.is_compacted(repo_name):
+                    continue
 
-    def check_commit_ID(self, current_student, assignment_alias, is_team_project):
-        if is_team_project:
-            repo_suffix = self.get_student_team(current_student['gt_id'])
+                repo_path = os.path.join("Repos", repo_name)
+                try:
+                    workspace.remove_working_tree(repo_path)
+                    self.check_output(['git', 'worktree', 'prune'], cwd=repo_path)
+                    self.check_output(['git', 'gc', '--quiet', '--prune=now'], cwd=repo_path)
+                except (OSError, subprocess.CalledProcessError), e:
+                    print '%s couldn\'t be compacted: %s' % (repo_name, e)
+                workspace_index.set_compacted(repo_name, profiler.get_directory_size(repo_path))
+                compacted.append(repo_name)
+
+            for repo_name in candidates:
+                if workspace_index.get_total_size() <= self.workspace_budget:
+                    break
+
+                workspace.remove_tree(os.path.join("Repos", repo_name))
+                workspace_index.forget(repo_name)
+                removed.append(repo_name)
+
+            workspace_index.save()
+
+        if len(compacted) > 0 or len(removed) > 0:
+            print 'Workspace: compacted %s and removed %s repo(s); Repos/ now holds %.1f MB of %.1f MB' % (
+                len(compacted), len(removed), workspace_index.get_total_size() / 1e6, self.workspace_budget / 1e6)
+        if workspace_index.get_total_size() > self.workspace_budget:
+            print 'Workspace: the repos graded in this run alone are over workspace_budget'
+
+    def rehydrate_repo(self, repo_suffix):
+        # for checking out outside prep_repos: a repo manage_workspace removed is cloned again, and a compacted one gets
+        # its working tree back
+        self.mark_repo_used(repo_suffix)
+        if not os.path.isdir(self.get_repo_path(repo_suffix)):
+            if not os.path.isdir("Repos"):
+                os.makedirs("Repos")
+            self.clone_repo(repo_suffix, checkout=False)  # the checkout that follows writes the files
+        elif workspace.Workspace(self.workspace_filename).is_compacted(os.path.basename(self.get_repo_path(repo_suffix))):
+            self.run_git(repo_suffix, ['reset', '--hard', '--quiet'])
+
+    def setup_reference_repo(self):
+        with self.profile_stage('reference repo'):
+            if not os.path.isdir(self.reference_repo_path):
+                self.check_output(['git', 'clone', '--mirror', self.reference_repo_url, self.reference_repo_path])
+            elif self.pull_from_github:
+                self.check_output(['git', 'fetch', '--prune'], cwd=self.reference_repo_path)
+
+    def get_clone_options(self):
+        options = []
+        if self.reference_repo_url != None:
+            # don't delete the reference repo afterwards; clones need it for the objects they borrow
+            options += ['--reference-if-able', os.path.abspath(self.reference_repo_path)]
+        if self.clone_depth != None:
+            options += ['--depth', str(self.clone_depth), '--no-single-branch']
+        if self.clone_filter != None:
+            options += ['--filter=%s' % self.clone_filter]
+
+        return options
+
+    def has_commits(self, repo_suffix, commit_IDs):
+        if len(commit_IDs) == 0:
+            return True
+
+        with self.profile_stage('commit lookup', repo_suffix):
+            commits = self.get_git_repo(repo_suffix).get_commits(commit_IDs)
+
+        return None not in commits.values()
+
+    def pull_repo(self, repo_suffix):
+        # a checked out submission leaves HEAD detached, which 'git pull' can't merge into; the fetch is enough then, and
+        # it's all that's needed when the working tree isn't kept up to date anyway
+        if not self.checkout_commits or self.is_head_detached(repo_suffix):
+            self.run_git(repo_suffix, ['fetch'])
         else:
-            repo_suffix = current_student['gt_id']
+            self.run_git(repo_suffix, ['pull', '--ff-only'])
+
+    def is_head_detached(self, repo_suffix):
+        return self.get_detached_head(repo_suffix) != None
+
+    def get_detached_head(self, repo_suffix):
+        # .git/HEAD holds 'ref: refs/heads/<branch>' on a branch and a bare SHA when detached; reading it saves a process
+        with open(os.path.join(self.get_repo_path(repo_suffix), '.git', 'HEAD'), 'r') as head_file:
+            head = head_file.read().strip()
 
-        command_checkout = "cd Repos/" + self.folder_prefix + repo_suffix + ";" + "git checkout " + \
-                           current_student[assignment_alias]['commitID'] + "; git log --pretty=format:'%H' -n 1; cd -"
-        output_checkout = self.get_command_output(command_checkout)
+        return None if head.startswith('ref: ') else head
 
-        if platform.system() == "Windows":
-            commit = output_checkout[1:len(output_checkout)-1]  # windows returns \\ prefix and suffix
+    def check_timestamp_github(self, current_student, assignment_alias, is_team_project=False):
+        if not current_student.results[assignment_alias].commit_id_valid:
+            current_student.results[assignment_alias].epoch_github = None
         else:
-            commit = output_checkout.split('/')[0]
+            repo_suffix = self.get_repo_suffix(current_student, is_team_project)
 
-        current_student[assignment_alias]['commitID valid'] = commit == current_student[assignment_alias]['commitID']
+            # the committer time is stored as UTC epoch seconds, and only formatted for the report
+            with self.profile_stage('timestamp lookup', repo_suffix):
+                commit = self.get_git_repo(repo_suffix).get_commit(current_student.results[assignment_alias].commit_id)
+            current_student.results[assignment_alias].epoch_github = commit.timestamp
 
         return current_student
 
-    def has_pulled_repo_for_team(self, is_team_project, team_number):
-        has_already_pulled = False
+    def get_t_square_epoch(self, timestamp):
+        # T-Square writes UTC as YYYYMMDDHHMMSS plus milliseconds, e.g. 20170909120500123
+        try:
+            return calendar.timegm(time.strptime(timestamp.strip()[:14], '%Y%m%d%H%M%S'))
+        except ValueError:
+            return None  # reported like a missing timestamp
+
+    def get_epoch(self, text):
+        # deadlines are written in datetime_format, UTC
+        return calendar.timegm(time.strptime(text, self.datetime_format))
+
+    def format_epoch(self, epoch, default):
+        if epoch == None:
+            return default
+
+        return time.strftime(self.datetime_format, time.gmtime(epoch))
+
+    def get_deadlines(self, deadline, extensions=None):
+        # (deadline, {gt_id or team -> extended deadline}) as UTC epoch seconds
+        extension_epochs = {}
+        for student, extension in (extensions or {}).items():
+            extension_epochs[student] = self.get_epoch(extension)
+
+        return self.get_epoch(deadline), extension_epochs
+
+    def get_cutoff(self, current_student, deadlines, is_team_project=False):
+        # the student's own extension wins over their team's, and either over the assignment deadline
+        deadline_epoch, extension_epochs = deadlines
+        return extension_epochs.get(current_student.gt_id,
+                                    extension_epochs.get(self.get_repo_suffix(current_student, is_team_project), deadline_epoch)) + self.grace_period
+
+    def evaluate_deadlines(self, graded, assignment_alias, deadlines, is_team_project=False):
+        # sets the GitHub and T-Square statuses for every (t_square_id, record) in one pass over the epochs
+        results = [current_student.results[assignment_alias] for _, current_student in graded]
+        cutoffs = [self.get_cutoff(current_student, deadlines, is_team_project) for _, current_student in graded]
+
+        # a GitHub commit has to be before the deadline, while a T-Square submission can be right on it.
+        # No status if there's nothing to check, e.g. no commit ID or no T-Square submission
+        github_statuses = [None if result.commit_id_valid == None else records.NOT_APPLICABLE if result.epoch_github == None
+                           else records.OK if result.epoch_github < cutoff else records.LATE
+                           for result, cutoff in zip(results, cutoffs)]
+        t_square_statuses = [None if result.epoch_t_square == None else records.OK if result.epoch_t_square <= cutoff else records.LATE
+                             for result, cutoff in zip(results, cutoffs)]
+
+        for result, github_status, t_square_status in zip(results, github_statuses, t_square_statuses):
+            result.github_status = github_status
+            result.t_square_status = t_square_status
+
+    def resolve_fallback_commits(self, graded, assignment_alias, deadlines, is_team_project=False):
+        # for every Missing/Invalid/bad commit ID, the last commit before the student's deadline and the first one on or
+        # after it, so a TA can see what they probably meant to submit. Each flagged repo's history is walked once.
+        flagged = [current_student for _, current_student in graded if not current_student.results[assignment_alias].commit_id_valid]
+        repo_suffixes = sorted(set([self.get_repo_suffix(current_student, is_team_project) for current_student in flagged]))
+
+        def walk(repo_suffix):
+            if not os.path.isdir(self.get_repo_path(repo_suffix)):
+                return repo_suffix, None  # the clone failed
 
-        if is_team_project:
-            if team_number in self._pulled_teams:
-                has_already_pulled = True
-            else:
-                self._pulled_teams.append(team_number)
+            try:
+                with self.profile_stage('fallback lookup', repo_suffix):
+                    if self._profiler != None:
+                        self._profiler.count_subprocess()
+                    return repo_suffix, self.get_git_repo(repo_suffix).get_history()
+            except subprocess.CalledProcessError, e:
+                print '%s couldn\'t read the commit history: %s' % (repo_suffix, e)
+                return repo_suffix, None
+
+        histories = dict(self.map_in_pool(walk, repo_suffixes))
+
+        for current_student in flagged:
+            history = histories[self.get_repo_suffix(current_student, is_team_project)]
+            if history == None:
+                continue
+
+            # same rule as the GitHub deadline check: on time means before the cutoff
+            cutoff = self.get_cutoff(current_student, deadlines, is_team_project)
+            before = [(commit.timestamp, commit.sha) for commit in history if commit.timestamp < cutoff]
+            after = [(commit.timestamp, commit.sha) for commit in history if commit.timestamp >= cutoff]
+            current_student.results[assignment_alias].fallback = {
+                'before': list(reversed(max(before))) if len(before) > 0 else None,
+                'after': list(reversed(min(after))) if len(after) > 0 else None}
 
-        return has_already_pulled
+    def check_commit_ID(self, current_student, assignment_alias, is_team_project):
+        repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+        result = current_student.results[assignment_alias]
+
+        with self.profile_stage('commit lookup', repo_suffix):
+            commit = self.get_git_repo(repo_suffix).get_commit(result.commit_id)
+
+        result.commit_id_valid = commit is not None and commit.sha.startswith(result.commit_id)
+        if result.commit_id_valid:
+            result.commit_id = commit.sha  # expand abbreviated SHAs
 
-    def get_command_output(self, command):
-        my_system = platform.system()
-        if my_system == 'Windows':
-            command = command.replace(';', '&')  # windows chains commands with &, linux/macOS with ;
-            command = command.replace('& cd -', '')  # windows doesn't support 'go back to last directory' with 'cd -', so remove it
+        # team repos are checked out once per team, to the most recent valid commit, after every member is checked
+        if result.commit_id_valid and self.checkout_commits and not is_team_project:
+            try:
+                with self.profile_stage('checkout', repo_suffix):
+                    self.run_git(repo_suffix, ['checkout', result.commit_id])
+            except subprocess.CalledProcessError, e:
+                print '%s couldn\'t check out %s: %s' % (current_student.gt_id, result.commit_id, e)
+
+        return current_student
 
-        output = subprocess.check_output(command, shell=True)
+    def autograde(self, graded, assignment_alias, command, is_team_project=False, failed_repos=()):
+        # runs command once per repo, at the student's valid commit or the team's most recent one, and attaches the
+        # result to every graded record for that repo. Commits already run for this assignment come from the cache.
+        commits = self.get_graded_commits(graded, assignment_alias, is_team_project)
+        cache = autograder.ResultCache(self.autograde_cache_filename)
+
+        def run(repo_suffix):
+            commit_ID = commits[repo_suffix]
+            cached = cache.get(assignment_alias, commit_ID, command)
+            if cached != None:
+                return repo_suffix, cached
+
+            log_file_name = os.path.join(self.autograde_log_folder, assignment_alias,
+                                         '%s%s-%s.log' % (self.folder_prefix, repo_suffix, commit_ID))
+            with self.get_repo_lock(repo_suffix):
+                with self.profile_stage('autograde', repo_suffix):
+                    try:
+                        self.run_git(repo_suffix, ['checkout', '--force', commit_ID])
+                    except subprocess.CalledProcessError, e:
+                        print '%s couldn\'t check out %s for the autograder: %s' % (repo_suffix, commit_ID, e)
+                        return repo_suffix, None  # not cached; try again next run
+
+                    if self._profiler != None:
+                        self._profiler.count_subprocess()
+                    result = autograder.run_command(command, self.get_repo_path(repo_suffix), self.autograde_timeout, log_file_name)
 
-        return output
+            print '%s autograder: %s' % (repo_suffix, result['status'])
+            cache.put(assignment_alias, commit_ID, command, result)
+            return repo_suffix, result
 
-    def generate_report(self, assignment, students=[], report_name=None, is_team_project=False):
-        print 'Report: %s\n' % assignment
         try:
-            student_aliases = None  # scope
-            with open(self.student_alias_filename, 'r') as alias_file:
-                student_aliases = json.load(alias_file)
+            repo_suffixes = sorted([repo_suffix for repo_suffix in commits if repo_suffix not in failed_repos or
+                                    os.path.isdir(self.get_repo_path(repo_suffix))])
+            results = dict(self.map_in_pool(run, repo_suffixes, self.autograde_workers))
+        finally:
+            cache.save()
+
+        for t_square_id, current_student in graded:
+            current_student.results[assignment_alias].autograde = results.get(self.get_repo_suffix(current_student, is_team_project))
+
+    def find_similar_submissions(self, graded, assignment_alias, threshold, is_team_project=False, paths=None):
+        # MinHash signature of the files (under paths) at each repo's graded commit, read through the cat-file backend
+        # and cached by SHA; LSH then finds the pairs at or over threshold without comparing every pair. Each record
+        # gets the students (or teams) it's similar to.
+        commits = self.get_graded_commits(graded, assignment_alias, is_team_project)
+        cache = similarity.SignatureCache(self.similarity_cache_filename)
+
+        def sign(repo_suffix):
+            commit_ID = commits[repo_suffix]
+            if not cache.has(commit_ID, paths):
+                with self.profile_stage('similarity', repo_suffix):
+                    if self._profiler != None:
+                        self._profiler.count_subprocess()  # ls-tree; the file contents come from cat-file
+                    try:
+                        files = self.get_git_repo(repo_suffix).get_files(commit_ID, paths, similarity.MAX_FILE_SIZE)
+                    except subprocess.CalledProcessError, e:
+                        print '%s couldn\'t read the files at %s: %s' % (repo_suffix, commit_ID, e)
+                        return repo_suffix, None
+                    cache.put(commit_ID, paths, similarity.get_signature(similarity.get_shingles(files)))
 
-            student_records = None  # scope
-            with open(self.student_records_filename, 'r') as records_file:
-                student_records = json.load(records_file)
+            return repo_suffix, cache.get(commit_ID, paths)
 
-            if students == None or len(students) == 0:
-                students = student_aliases.keys()  # all students!
+        try:
+            signatures = dict([(repo_suffix, signature) for repo_suffix, signature in self.map_in_pool(sign, sorted(commits))
+                               if signature != None])  # no text files to compare
+        finally:
+            cache.save()
 
-            late_github = []
-            late_t_square = []
-            missing = []
-            bad_commit = []
+        with self.profile_stage('similarity index'):
+            pairs = similarity.find_similar_pairs(signatures, threshold)
 
-            file_object = None
+        similar = dict([(repo_suffix, []) for repo_suffix in signatures])
+        for repo_suffix, other_repo_suffix, estimate in pairs:
+            similar[repo_suffix].append([other_repo_suffix, round(estimate, 3)])
+            similar[other_repo_suffix].append([repo_suffix, round(estimate, 3)])
 
-            if report_name != None:
-                file_object = open(report_name, 'w')
+        for t_square_id, current_student in graded:
+            current_student.results[assignment_alias].similar = similar.get(self.get_repo_suffix(current_student, is_team_project))
 
-            if is_team_project:
-                teams = self.get_dictionary_from_json_file(self.team_members_filename)
-                full_list = []
-                for team in students:
-                    members = teams[team]
-                    full_list.append(team)
-                    full_list += members
-                students = full_list
+        if len(pairs) > 0:
+            print 'SIMILAR SUBMISSIONS: %s pair(s) at or over %s' % (len(pairs), threshold)
 
-            for student in students:
-                if student == '':  # ignore whitespace/blank lines
-                    continue
+    def get_graded_commits(self, graded, assignment_alias, is_team_project=False):
+        # repo suffix -> the commit graded there: the student's valid commit, or the team's most recent valid one
+        commits = {}  # repo suffix -> (epoch, sha)
+        for t_square_id, current_student in graded:
+            result = current_student.results[assignment_alias]
+            if result.commit_id_valid and result.epoch_github != None:
+                repo_suffix = self.get_repo_suffix(current_student, is_team_project)
+                commits[repo_suffix] = max(commits.get(repo_suffix), (result.epoch_github, result.commit_id))
 
-                if is_team_project and "Team" in student:
-                    self.print_to_file_and_console("\n========== %s ==========" % student, file_object)
-                    continue
+        return dict([(repo_suffix, commit_ID) for repo_suffix, (epoch, commit_ID) in commits.items()])
 
-                t_square_id = student_aliases[student]
-                student_info = student_records[t_square_id]
+    def has_pulled_repo_for_team(self, is_team_project, team_number):
+        has_already_pulled = False
 
-                self.print_to_file_and_console(student, file_object)
-                if assignment not in student_info:
-                    self.print_to_file_and_console('\tNo records found', file_object)
-                    missing.append(student)
-                    continue
+        if is_team_project:
+            if team_number in self._pulled_teams:
+                has_already_pulled = True
+            else:
+                self._pulled_teams.add(team_number)
+
+        return has_already_pulled
 
-                for key in reversed(sorted(student_info[assignment].keys())):
-                    self.print_to_file_and_console('\t%s: %s' % (key, student_info[assignment][key]), file_object)
+    def get_git_repo(self, repo_suffix):
+        with self._lock:
+            if repo_suffix not in self._git_repos:
+                self._git_repos[repo_suffix] = git_backend.GitRepo(self.get_repo_path(repo_suffix))
+                if self._profiler != None:
+                    self._profiler.count_subprocess()  # its 'git cat-file --batch' serves every later lookup
+
+            return self._git_repos[repo_suffix]
+
+    def forget_git_repo(self, repo_suffix):
+        with self._lock:
+            if repo_suffix in self._git_repos:
+                self._git_repos[repo_suffix].forget()
+
+    def get_repo_lock(self, repo_suffix):
+        with self._lock:
+            if repo_suffix not in self._repo_locks:
+                self._repo_locks[repo_suffix] = threading.Lock()
+
+            return self._repo_locks[repo_suffix]
+
+    def close_git_repos(self):
+        with self._lock:
+            for git_repo in self._git_repos.values():
+                git_repo.close()
+            self._git_repos = {}
+
+    def run_git(self, repo_suffix, arguments):
+        return self.check_output(['git'] + arguments, cwd=self.get_repo_path(repo_suffix))
+
+    def check_output(self, arguments, cwd=None):
+        # every git call goes through here so profiled runs can count them
+        if self._profiler != None:
+            self._profiler.count_subprocess()
+
+        return subprocess.check_output(arguments, cwd=cwd)
+
+    def start_profiling(self):
+        if self.profile and self._profiling_depth == 0:
+            self._profiler = profiler.StageProfiler()
+        if self._profiler != None:
+            self._profiling_depth += 1
+
+    def finish_profiling(self, run_info):
+        if self._profiler == None:
+            return
+
+        self._profiling_depth -= 1
+        if self._profiling_depth == 0:
+            self._profiler.write_trace(self.trace_filename, run_info)
+            print self._profiler.get_summary()
+            print 'Trace saved to %s' % self.trace_filename
+            self._profiler = None
+
+    def profile_stage(self, name, student=None):
+        # use as 'with self.profile_stage(...) as stage'; stage is None when profiling is off
+        if self._profiler == None:
+            return profiler.NULL_STAGE
+
+        return self._profiler.stage(name, student)
+
+    def get_object_size(self, stage, repo_suffix):
+        if stage == None:
+            return 0  # walking .git/objects isn't free, so only do it when profiling
+
+        return profiler.get_directory_size(os.path.join(self.get_repo_path(repo_suffix), '.git', 'objects'))
+
+    def add_bytes_fetched(self, stage, repo_suffix, size_before):
+        # on-disk growth of the object store, which is close to what came over the wire
+        if stage != None:
+            self._profiler.add_bytes_fetched(max(0, self.get_object_size(stage, repo_suffix) - size_before))
+
+    def generate_report(self, assignment, students=[], report_name=None, is_team_project=False, formats=(), echo=True):
+        # formats: any of 'csv' and 'json' for gradebook import, saved next to report_name (<assignment>.csv without one).
+        # echo=False keeps the report off the console, e.g. for the whole class
+        if echo:
+            print 'Report: %s\n' % assignment
+        try:
+            store = self.open_record_store()
+            try:
+                student_records = store.load_students(assignment)
+            finally:
+                store.close()
 
-                    if key == 'Submission GitHub' and student_info[assignment][key] == 'late':
-                        late_github.append(student)
+            assignment_report = report.AssignmentReport(assignment)
+            if is_team_project:
+                student_roster = self.get_roster()
+                for team in students:
+                    if team == '':  # ignore whitespace/blank lines
+                        continue
 
-                    if key == 'Submission T-Square' and student_info[assignment][key] == 'late':
-                        late_t_square.append(student)
+                    assignment_report.add_team(team)
+                    for student in student_roster.get_members(team):
+                        self.add_to_report(assignment_report, student_records[student_roster.get_t_square_id(student)], team)
+            elif students == None or len(students) == 0:
+                # all students, straight from the records
+                for student_info in sorted(student_records.values(), key=lambda student_info: student_info.gt_id):
+                    self.add_to_report(assignment_report, student_info)
+            else:
+                student_roster = self.get_roster()
+                for student in students:
+                    if student == '':  # ignore whitespace/blank lines
+                        continue
 
-                    if key == 'commitID' and student_info[assignment][key] == 'Missing':
-                        missing.append(student)
+                    self.add_to_report(assignment_report, student_records[student_roster.get_t_square_id(student)])
 
-                    if key == 'commitID valid' and student_info[assignment][key] == False:
-                        bad_commit.append(student)
+            if report_name != None:
+                assignment_report.write_text(report_name)
 
-            self.print_to_file_and_console('\nLATE SUBMISSIONS:', file_object)
-            self.print_to_file_and_console('\tT-Square (%s): ' % len(late_t_square) + ', '.join(sorted(late_t_square)), file_object)
-            self.print_to_file_and_console('\tGitHub (%s): ' % len(late_github) + ', '.join(sorted(late_github)), file_object)
-            self.print_to_file_and_console('\nMISSING SUBMISSIONS (%s):' % len(missing), file_object)
-            self.print_to_file_and_console('\t' + ', '.join(sorted(missing)), file_object)
-            self.print_to_file_and_console('\nBAD COMMITS (%s):\n\t' % len(bad_commit) + ', '.join(sorted(bad_commit)), file_object)
+            file_prefix = os.path.splitext(report_name)[0] if report_name != None else assignment
+            for report_format in formats:
+                assignment_report.write(report_format, '%s.%s' % (file_prefix, report_format))
 
-            if file_object != None:
-                file_object.close()
+            if echo:
+                sys.stdout.write(assignment_report.get_text())
         except IOError:
             print 'generate_report couldn\'t find %s file. Try running create_student_json first.' % self.student_alias_filename
             raise IOError
 
-    def print_to_file_and_console(self, text, file_object):
-        print text
-        if file_object != None:
-            file_object.write(text + "\n")
-
-    def commit_id_present(self, commitID_message):
-        return commitID_message != 'Invalid' and commitID_message != 'Missing'
\ No newline at end of file
+        return assignment_report
+
+    def add_to_report(self, assignment_report, student_info, team=None):
+        assignment = assignment_report.assignment
+        result = student_info.results.get(assignment)
+        assignment_report.add_student(student_info.gt_id, student_info.name,
+                                      self.get_display_result(result) if result != None else None, team)
+
+    def get_display_result(self, result):
+        # timestamps are kept as epochs and only turned into strings here
+        result = result.to_dict()
+        if 'Epoch GitHub' in result:
+            result['Timestamp GitHub'] = self.format_epoch(result.pop('Epoch GitHub'), 'N/A')
+        if 'Epoch T-Square' in result:
+            result['Timestamp T-Square'] = self.format_epoch(result.pop('Epoch T-Square'), 'Missing')
+        if 'Fallback commits' in result:
+            fallback = result.pop('Fallback commits')
+            result['Fallback before deadline'] = self.format_fallback_commit(fallback['before'])
+            result['Fallback after deadline'] = self.format_fallback_commit(fallback['after'])
+        if 'Autograder' in result:
+            autograde = result.pop('Autograder')
+            result['Autograder'] = autograde['status']
+            result['Autograder log'] = autograde['log']
+
+        return result
+
+    def format_fallback_commit(self, commit):
+        if commit == None:
+            return 'None'
+
+        commit_ID, epoch = commit
+        return '%s (%s)' % (commit_ID, self.format_epoch(epoch, 'N/A'))
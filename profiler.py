@@ -0,0 +1,121 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+def get_directory_size(path):
+    size = 0
+    for directory, folders, files in os.walk(path):
+        for file_name in files:
+            try:
+                size += os.path.getsize(os.path.join(directory, file_name))
+            except OSError:
+                pass  # git may have packed or pruned it in the meantime
+
+    return size
+
+
+class StageProfiler:
+    # wall time, subprocess count and bytes fetched for each stage, per student/repo and in total
+    def __init__(self):
+        self.started = time.time()
+        self._events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()  # stack of the stages open on this thread
+
+    @contextlib.contextmanager
+    def stage(self, name, student=None):
+        event = {'stage': name, 'student': student, 'start': time.time() - self.started,
+                 'seconds': 0.0, 'subprocesses': 0, 'bytes_fetched': 0}
+        stack = self._get_stack()
+        stack.append(event)
+        try:
+            yield event
+        finally:
+            stack.pop()
+            event['seconds'] = time.time() - self.started - event['start']
+            with self._lock:
+                self._events.append(event)
+
+    def count_subprocess(self):
+        # counted against the innermost stage open on this thread
+        stack = self._get_stack()
+        if len(stack) > 0:
+            stack[-1]['subprocesses'] += 1
+
+    def add_bytes_fetched(self, byte_count):
+        stack = self._get_stack()
+        if len(stack) > 0:
+            stack[-1]['bytes_fetched'] += byte_count
+
+    def get_stage_totals(self):
+        return self._get_totals('stage')
+
+    def get_student_totals(self):
+        return self._get_totals('student')
+
+    def write_trace(self, file_name, run_info=None):
+        with open(file_name, 'w') as trace_file:
+            json.dump({'run': run_info or {},
+                       'seconds': time.time() - self.started,
+                       'stages': self.get_stage_totals(),
+                       'students': self.get_student_totals(),
+                       'events': sorted(self._events, key=lambda event: event['start'])}, trace_file, indent=1)
+
+    def get_summary(self, slowest_count=10):
+        lines = ['%-20s %8s %10s %10s %10s %8s %12s' % ('STAGE', 'COUNT', 'TOTAL (s)', 'MEAN (s)', 'MAX (s)',
+                                                         'PROCS', 'FETCHED (B)')]
+        stage_totals = self.get_stage_totals()
+        for name, totals in sorted(stage_totals.items(), key=lambda item: -item[1]['seconds']):
+            lines.append('%-20s %8d %10.2f %10.3f %10.3f %8d %12d' % (
+                name, totals['count'], totals['seconds'], totals['seconds'] / totals['count'], totals['max_seconds'],
+                totals['subprocesses'], totals['bytes_fetched']))
+
+        lines.append('Total wall time: %.2f s' % (time.time() - self.started))
+
+        student_totals = self.get_student_totals()
+        if len(student_totals) > 0:
+            lines.append('\nSLOWEST (%s of %s):' % (min(slowest_count, len(student_totals)), len(student_totals)))
+            slowest = sorted(student_totals.items(), key=lambda item: -item[1]['seconds'])[:slowest_count]
+            for student, totals in slowest:
+                lines.append('\t%s: %.2f s, %d subprocesses, %d bytes fetched' % (
+                    student, totals['seconds'], totals['subprocesses'], totals['bytes_fetched']))
+
+        return '\n'.join(lines)
+
+    def _get_stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _get_totals(self, key):
+        totals = {}
+        with self._lock:
+            events = list(self._events)
+
+        for event in events:
+            if event[key] == None:
+                continue
+            total = totals.setdefault(event[key], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                   'subprocesses': 0, 'bytes_fetched': 0})
+            total['count'] += 1
+            total['seconds'] += event['seconds']
+            total['max_seconds'] = max(total['max_seconds'], event['seconds'])
+            total['subprocesses'] += event['subprocesses']
+            total['bytes_fetched'] += event['bytes_fetched']
+
+        return totals
+
+
+class NullStage:
+    # stands in for StageProfiler.stage when profiling is off
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
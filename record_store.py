@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+
+import records
+
+
+# both stores hand out records.StudentRecord / records.SubmissionResult objects and take the same back; import_records
+# and export_records use the student_records.json layout instead
+
+
+class JsonRecordStore:
+    # the original student_records.json layout: t_square_id -> {'name', 'gt_id', <assignment>: {result}}
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._students = None  # t_square_id -> records.StudentRecord
+        self._dirty = False
+
+    def _load(self):
+        if self._students == None:
+            with open(self.file_name, 'r') as records_file:
+                self._students = self._from_dicts(json.load(records_file))
+
+        return self._students
+
+    def _from_dicts(self, students):
+        return dict([(t_square_id, records.StudentRecord.from_dict(record)) for t_square_id, record in students.items()])
+
+    def load_students(self, assignment_alias=None):
+        # the JSON file is read whole, so every assignment comes back regardless of assignment_alias
+        return self._load()
+
+    def get_result(self, t_square_id, assignment_alias):
+        return self._load()[t_square_id].results.get(assignment_alias)
+
+    def save_result(self, t_square_id, assignment_alias, result):
+        self._load()[t_square_id].results[assignment_alias] = result
+        self._dirty = True
+
+    def find_students(self, assignment_alias, field, value):
+        # field and value as they're saved in the JSON file, e.g. 'Submission GitHub', 'late'
+        return sorted([t_square_id for t_square_id, record in self._load().items()
+                       if assignment_alias in record.results and record.results[assignment_alias].to_dict().get(field) == value])
+
+    def import_records(self, students):
+        self._students = self._from_dicts(students)
+        self._dirty = True
+        self.flush()
+
+    def export_records(self):
+        return dict([(t_square_id, record.to_dict()) for t_square_id, record in self._load().items()])
+
+    def flush(self):
+        # the whole file is rewritten, so only do this once per run
+        if self._dirty:
+            students = self.export_records()
+            with open(self.file_name, 'w') as records_file:
+                json.dump(students, records_file)
+            self._dirty = False
+
+    def close(self):
+        self._students = None  # unsaved results are dropped, like a run that never got to flush
+
+
+class SqliteRecordStore:
+    # one row per (student, assignment, field); every save_result is its own transaction, so a crash loses nothing saved
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._connection = sqlite3.connect(file_name)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS students "
+                                     "(t_square_id TEXT PRIMARY KEY, name TEXT NOT NULL, gt_id TEXT NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS students_gt_id ON students (gt_id)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                     "(t_square_id TEXT NOT NULL, assignment TEXT NOT NULL, field TEXT NOT NULL, "
+                                     "value TEXT, PRIMARY KEY (t_square_id, assignment, field))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_lookup ON results (assignment, field, value)")
+
+    def load_students(self, assignment_alias=None):
+        students = {}
+        for t_square_id, name, gt_id in self._connection.execute("SELECT t_square_id, name, gt_id FROM students"):
+            students[t_square_id] = records.StudentRecord(name, gt_id)
+
+        if assignment_alias == None:
+            rows = self._connection.execute("SELECT t_square_id, assignment, field, value FROM results")
+        else:
+            rows = self._connection.execute("SELECT t_square_id, assignment, field, value FROM results "
+                                            "WHERE assignment = ?", (assignment_alias,))
+
+        results = {}  # (t_square_id, assignment) -> {field: value}
+        for t_square_id, assignment, field, value in rows:
+            if t_square_id in students:
+                results.setdefault((t_square_id, assignment), {})[field] = json.loads(value)
+
+        for (t_square_id, assignment), result in results.items():
+            students[t_square_id].results[assignment] = records.SubmissionResult.from_dict(result)
+
+        return students
+
+    def get_result(self, t_square_id, assignment_alias):
+        rows = self._connection.execute("SELECT field, value FROM results WHERE t_square_id = ? AND assignment = ?",
+                                        (t_square_id, assignment_alias)).fetchall()
+        if len(rows) == 0:
+            return None
+
+        return records.SubmissionResult.from_dict(dict([(field, json.loads(value)) for field, value in rows]))
+
+    def save_result(self, t_square_id, assignment_alias, result):
+        with self._connection:
+            self._connection.execute("DELETE FROM results WHERE t_square_id = ? AND assignment = ?",
+                                     (t_square_id, assignment_alias))
+            self._connection.executemany("INSERT INTO results (t_square_id, assignment, field, value) VALUES (?, ?, ?, ?)",
+                                         [(t_square_id, assignment_alias, field, json.dumps(value))
+                                          for field, value in result.to_dict().items()])
+
+    def find_students(self, assignment_alias, field, value):
+        # e.g. find_students(assignment, 'Submission GitHub', 'late'); uses the results_lookup index
+        rows = self._connection.execute("SELECT t_square_id FROM results WHERE assignment = ? AND field = ? AND value = ? "
+                                        "ORDER BY t_square_id", (assignment_alias, field, json.dumps(value)))
+        return [t_square_id for t_square_id, in rows]
+
+    def import_records(self, students):
+        # takes the student_records.json layout; students not in it are left alone
+        with self._connection:
+            for t_square_id, record in students.items():
+                self._connection.execute("INSERT OR REPLACE INTO students (t_square_id, name, gt_id) VALUES (?, ?, ?)",
+                                         (t_square_id, record['name'], record['gt_id']))
+                for assignment_alias, result in record.items():
+                    if isinstance(result, dict):
+                        self._connection.execute("DELETE FROM results WHERE t_square_id = ? AND assignment = ?",
+                                                 (t_square_id, assignment_alias))
+                        self._connection.executemany("INSERT INTO results (t_square_id, assignment, field, value) "
+                                                     "VALUES (?, ?, ?, ?)",
+                                                     [(t_square_id, assignment_alias, field, json.dumps(value))
+                                                      for field, value in result.items()])
+
+    def export_records(self):
+        return dict([(t_square_id, record.to_dict()) for t_square_id, record in self.load_students().items()])
+
+    def flush(self):
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class RunCheckpoint:
+    # JSON lines: the run's settings first, then one line per repo set up and per finished student, synced to disk as
+    # soon as it's written
+    def __init__(self, file_name, run_settings):
+        self.file_name = file_name
+        self.run_settings = run_settings
+        self._file = None
+        self._lock = threading.Lock()  # repos are set up on several threads
+
+    def load_finished(self):
+        # t_square_id -> result for a checkpoint left by an interrupted run with the same settings
+        return dict([(entry['t_square_id'], records.SubmissionResult.from_dict(entry['result']))
+                     for entry in self._load() if 't_square_id' in entry])
+
+    def load_set_up_repos(self):
+        # repo suffixes the interrupted run already cloned/pulled
+        return set([entry['repo'] for entry in self._load() if 'repo' in entry])
+
+    def _load(self):
+        try:
+            with open(self.file_name, 'r') as checkpoint_file:
+                lines = checkpoint_file.readlines()
+        except IOError:
+            return []
+
+        if len(lines) == 0 or self._parse(lines[0]) != {'run': self.run_settings}:
+            return []  # different assignment, deadline or student list; start over
+
+        return [entry for entry in map(self._parse, lines[1:]) if entry != None]
+
+    def start(self, finished=None, set_up_repos=()):
+        self._file = open(self.file_name, 'w')
+        self._write({'run': self.run_settings})
+        for repo_suffix in sorted(set_up_repos):
+            self.save_repo(repo_suffix)
+        for t_square_id, result in (finished or {}).items():
+            self.save(t_square_id, result)
+
+    def save_repo(self, repo_suffix):
+        self._write({'repo': repo_suffix})
+
+    def save(self, t_square_id, result):
+        self._write({'t_square_id': t_square_id, 'result': result.to_dict()})
+
+    def finish(self):
+        # the run completed, so there's nothing to resume
+        self.close()
+        if os.path.isfile(self.file_name):
+            os.remove(self.file_name)
+
+    def close(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _parse(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None  # the last line is cut off if the run died while writing it
+
+
+def open_record_store(backend, json_file_name, sqlite_file_name):
+    if backend == 'json':
+        return JsonRecordStore(json_file_name)
+    if backend == 'sqlite':
+        return SqliteRecordStore(sqlite_file_name)
+
+    raise ValueError("Unknown record store '%s'; use 'json' or 'sqlite'" % backend)
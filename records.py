@@ -0,0 +1,125 @@
+import calendar
+import time
+
+# statuses are small ints in memory and the original strings in JSON
+OK, LATE, MISSING, INVALID, NOT_APPLICABLE = range(5)
+STATUS_NAMES = ['ok', 'late', 'Missing', 'Invalid', 'N/A']
+STATUSES = dict([(name, status) for status, name in enumerate(STATUS_NAMES)])
+
+LEGACY_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # 'Timestamp GitHub'/'Timestamp T-Square' in records from before epochs
+
+
+# __slots__ needs new-style classes; a class's worth of records for every assignment of a term adds up otherwise
+class SubmissionResult(object):
+    # one student's (or team member's) result for one assignment
+    __slots__ = ('commit_id', 'commit_status', 'commit_id_valid', 'epoch_github', 'epoch_t_square', 'github_status',
+                 't_square_status', 'fallback', 'autograde', 'similar', 'extra')
+
+    def __init__(self):
+        self.commit_id = None  # full or abbreviated SHA; None if commit_status is MISSING or INVALID
+        self.commit_status = None
+        self.commit_id_valid = None  # None until the commit is looked up in the repo
+        self.epoch_github = None  # committer time, UTC epoch seconds
+        self.epoch_t_square = None  # None if there's no T-Square submission
+        self.github_status = None  # OK, LATE or NOT_APPLICABLE once checked against the deadline
+        self.t_square_status = None  # OK or LATE
+        self.fallback = None  # no valid commit: {'before': [sha, epoch] or None, 'after': ...} around the deadline
+        self.autograde = None  # autograder.run_command's result for the commit that was built, if it was autograded
+        self.similar = None  # [[gt_id or team, estimated similarity], ...] over the threshold, if similarity was checked
+        self.extra = None  # fields this class doesn't know about, kept as they were
+
+    def has_commit_id(self):
+        return self.commit_id != None
+
+    def set_commit_id(self, commit_id):
+        # commit_id can also be 'Missing' or 'Invalid', as read from the submission
+        if commit_id in STATUSES:
+            self.commit_id = None
+            self.commit_status = STATUSES[commit_id]
+        else:
+            self.commit_id = commit_id
+            self.commit_status = None
+
+    def get_commit_id(self):
+        return self.commit_id if self.commit_status == None else STATUS_NAMES[self.commit_status]
+
+    def to_dict(self):
+        # the student_records.json layout; fields that were never set are left out, as before
+        result = dict(self.extra or {})
+        result['commitID'] = self.get_commit_id()
+        if self.commit_id_valid != None:
+            result['commitID valid'] = self.commit_id_valid
+            result['Epoch GitHub'] = self.epoch_github
+        result['Epoch T-Square'] = self.epoch_t_square
+        if self.github_status != None:
+            result['Submission GitHub'] = STATUS_NAMES[self.github_status]
+        if self.t_square_status != None:
+            result['Submission T-Square'] = STATUS_NAMES[self.t_square_status]
+        if self.fallback != None:
+            result['Fallback commits'] = self.fallback
+        if self.autograde != None:
+            result['Autograder'] = self.autograde
+        if self.similar != None:
+            result['Similar submissions'] = self.similar
+
+        return result
+
+    @classmethod
+    def from_dict(cls, result):
+        submission_result = cls()
+        fields = dict(result)
+        submission_result.set_commit_id(fields.pop('commitID', 'Missing'))
+        submission_result.commit_id_valid = fields.pop('commitID valid', None)
+        submission_result.epoch_github = fields.pop('Epoch GitHub', None)
+        submission_result.epoch_t_square = fields.pop('Epoch T-Square', None)
+        submission_result.github_status = STATUSES.get(fields.pop('Submission GitHub', None))
+        submission_result.t_square_status = STATUSES.get(fields.pop('Submission T-Square', None))
+        submission_result.fallback = fields.pop('Fallback commits', None)
+        submission_result.autograde = fields.pop('Autograder', None)
+        submission_result.similar = fields.pop('Similar submissions', None)
+
+        for key in ['Timestamp GitHub', 'Timestamp T-Square']:
+            if key in fields:
+                epoch = parse_legacy_timestamp(fields[key])
+                if epoch != None or fields[key] in STATUSES:
+                    del fields[key]
+                    if key == 'Timestamp GitHub':
+                        submission_result.epoch_github = epoch
+                    else:
+                        submission_result.epoch_t_square = epoch
+
+        submission_result.extra = fields or None
+
+        return submission_result
+
+
+class StudentRecord(object):
+    __slots__ = ('name', 'gt_id', 'results')
+
+    def __init__(self, name, gt_id, results=None):
+        self.name = name
+        self.gt_id = gt_id
+        self.results = results if results != None else {}  # assignment alias -> SubmissionResult
+
+    def to_dict(self):
+        record = {'name': self.name, 'gt_id': self.gt_id}
+        for assignment_alias, result in self.results.items():
+            record[assignment_alias] = result.to_dict()
+
+        return record
+
+    @classmethod
+    def from_dict(cls, record):
+        results = {}
+        for assignment_alias, result in record.items():
+            if isinstance(result, dict):
+                results[assignment_alias] = SubmissionResult.from_dict(result)
+
+        return cls(record['name'], record['gt_id'], results)
+
+
+def parse_legacy_timestamp(timestamp):
+    try:
+        return calendar.timegm(time.strptime(timestamp, LEGACY_DATETIME_FORMAT))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,127 @@
+import csv
+import json
+
+import autograder
+
+# gradebook columns, in order; the JSON export has every field of the record
+CSV_FIELDS = ['gt_id', 'name', 'team', 'commitID', 'commitID valid', 'Timestamp GitHub', 'Submission GitHub',
+              'Timestamp T-Square', 'Submission T-Square', 'Fallback before deadline', 'Fallback after deadline', 'Autograder',
+              'Similar submissions']
+
+
+class AssignmentReport:
+    # everything generate_report writes, collected in one pass over the records and written out in one go
+    def __init__(self, assignment):
+        self.assignment = assignment
+        self.late_github = []
+        self.late_t_square = []
+        self.missing = []
+        self.bad_commit = []
+        self.fallback_commits = []  # (gt_id, commit before the deadline, commit after) for students without a valid commit
+        self.autograded = []  # students with an autograder result
+        self.autograder_failures = []  # (gt_id, status) for every autograder result that isn't a pass
+        self.similarity_checked = []  # students whose submission was hashed for the similarity check
+        self.similar_pairs = set()  # (gt_id or team, other gt_id or team, estimated similarity)
+        self._lines = []
+        self._rows = []  # one dict per student for the CSV/JSON exports
+
+    def add_team(self, team):
+        self._lines.append("\n========== %s ==========" % team)
+
+    def add_student(self, gt_id, name, result, team=None):
+        # result is the student's record for the assignment as it should be shown, or None if there isn't one
+        row = {'gt_id': gt_id, 'name': name, 'team': team}
+        self._rows.append(row)
+
+        self._lines.append(gt_id)
+        if result == None:
+            self._lines.append('\tNo records found')
+            self.missing.append(gt_id)
+            return
+
+        if result.get('Similar submissions') != None:
+            name = team if team != None else gt_id  # team repos are compared with each other
+            self.similarity_checked.append(gt_id)
+            for other_name, estimate in result['Similar submissions']:
+                self.similar_pairs.add((min(name, other_name), max(name, other_name), estimate))
+            result = dict(result)
+            result['Similar submissions'] = ', '.join(['%s (%.2f)' % (other_name, estimate)
+                                                       for other_name, estimate in result['Similar submissions']]) or 'None'
+
+        for key in reversed(sorted(result.keys())):
+            self._lines.append('\t%s: %s' % (key, result[key]))
+        row.update(result)
+
+        if result.get('Submission GitHub') == 'late':
+            self.late_github.append(gt_id)
+        if result.get('Submission T-Square') == 'late':
+            self.late_t_square.append(gt_id)
+        if result.get('commitID') == 'Missing':
+            self.missing.append(gt_id)
+        if result.get('commitID valid') == False:
+            self.bad_commit.append(gt_id)
+        if 'Fallback before deadline' in result:
+            self.fallback_commits.append((gt_id, result['Fallback before deadline'], result['Fallback after deadline']))
+        if result.get('Autograder') != None:
+            self.autograded.append(gt_id)
+            if result['Autograder'] != autograder.PASSED:
+                self.autograder_failures.append((gt_id, result['Autograder']))
+
+    def get_text(self):
+        lines = self._lines + [
+            '\nLATE SUBMISSIONS:',
+            '\tT-Square (%s): ' % len(self.late_t_square) + ', '.join(sorted(self.late_t_square)),
+            '\tGitHub (%s): ' % len(self.late_github) + ', '.join(sorted(self.late_github)),
+            '\nMISSING SUBMISSIONS (%s):' % len(self.missing),
+            '\t' + ', '.join(sorted(self.missing)),
+            '\nBAD COMMITS (%s):\n\t' % len(self.bad_commit) + ', '.join(sorted(self.bad_commit))]
+        if len(self.fallback_commits) > 0:
+            lines.append('\nFALLBACK COMMITS (%s):' % len(self.fallback_commits))
+            lines += ['\t%s: before deadline %s, after deadline %s' % fallback for fallback in sorted(self.fallback_commits)]
+        if len(self.similarity_checked) > 0:
+            lines.append('\nSIMILAR SUBMISSIONS (%s pairs):' % len(self.similar_pairs))
+            lines += ['\t%s - %s: %.2f' % pair for pair in self.get_similar_pairs()]
+        if len(self.autograded) > 0:  # only runs with an autograde_command have this section
+            lines.append('\nAUTOGRADER FAILURES (%s of %s):\n\t' % (len(self.autograder_failures), len(self.autograded)) +
+                         ', '.join(['%s (%s)' % failure for failure in sorted(self.autograder_failures)]))
+
+        return ''.join([line + '\n' for line in lines])
+
+    def get_similar_pairs(self):
+        # most similar first
+        return sorted(self.similar_pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))
+
+    def write(self, report_format, file_name):
+        if report_format == 'text':
+            self.write_text(file_name)
+        elif report_format == 'csv':
+            self.write_csv(file_name)
+        elif report_format == 'json':
+            self.write_json(file_name)
+        else:
+            raise ValueError("Unknown report format '%s'; use 'text', 'csv' or 'json'" % report_format)
+
+    def write_text(self, file_name):
+        with open(file_name, 'w') as report_file:
+            report_file.write(self.get_text())
+
+    def write_csv(self, file_name):
+        with open(file_name, 'wb') as report_file:
+            writer = csv.DictWriter(report_file, CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for row in self._rows:
+                # the csv module can't write unicode, and names from the roster files are unicode
+                writer.writerow(dict([(key, value.encode('utf-8') if isinstance(value, unicode) else value)
+                                      for key, value in row.items()]))
+
+    def write_json(self, file_name):
+        with open(file_name, 'w') as report_file:
+            json.dump({'assignment': self.assignment,
+                       'students': self._rows,
+                       'late': {'T-Square': sorted(self.late_t_square), 'GitHub': sorted(self.late_github)},
+                       'missing': sorted(self.missing),
+                       'bad_commits': sorted(self.bad_commit),
+                       'fallback_commits': dict([(gt_id, {'before': before, 'after': after})
+                                                 for gt_id, before, after in self.fallback_commits]),
+                       'autograder_failures': dict(self.autograder_failures),
+                       'similar_pairs': self.get_similar_pairs()}, report_file, indent=1)
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+
+_json_files = {}  # (absolute file name, build) -> build(parsed contents); roster files are only parsed once per process
+_json_files_lock = threading.Lock()
+
+
+def load_json_file(file_name, build=None):
+    # build, if given, picks what's needed out of the parsed file, and only that is kept
+    key = (os.path.abspath(file_name), build)
+    with _json_files_lock:
+        if key not in _json_files:
+            with open(file_name, 'r') as json_file:
+                contents = json.load(json_file)
+            _json_files[key] = build(contents) if build != None else contents
+
+        return _json_files[key]
+
+
+def forget_json_file(file_name):
+    # call after rewriting a roster file so the next lookup reads the new version
+    path = os.path.abspath(file_name)
+    with _json_files_lock:
+        for key in [key for key in _json_files if key[0] == path]:
+            del _json_files[key]
+
+
+def get_student_index(records):
+    # t_square_id -> (name, gt_id); student_records.json also has every assignment's results, which aren't kept
+    return dict([(t_square_id, (record['name'], record['gt_id'])) for t_square_id, record in records.items()])
+
+
+class Roster:
+    # gt_id <-> T-Square id <-> submission folder name <-> team <-> members, built once from the roster files
+    def __init__(self, student_records_filename, student_alias_filename, team_records_filename, team_members_filename):
+        self.student_records_filename = student_records_filename
+        self.student_alias_filename = student_alias_filename
+        self.team_records_filename = team_records_filename
+        self.team_members_filename = team_members_filename
+
+        self._students = None  # t_square_id -> (name, gt_id)
+        self._t_square_ids = None  # gt_id -> t_square_id
+        self._teams = None  # gt_id -> team
+        self._members = None  # team -> [gt_id]
+
+    def _load_students(self):
+        if self._students != None:
+            return
+
+        self._t_square_ids = dict(load_json_file(self.student_alias_filename))
+        self._students = load_json_file(self.student_records_filename, get_student_index)
+
+    def _load_teams(self):
+        if self._teams != None:
+            return
+
+        self._members = load_json_file(self.team_members_filename)
+        self._teams = load_json_file(self.team_records_filename)
+
+    def get_gt_ids(self):
+        self._load_students()
+        return self._t_square_ids.keys()
+
+    def get_t_square_id(self, gt_id):
+        self._load_students()
+        return self._t_square_ids[gt_id]
+
+    def get_folder_name(self, gt_id):
+        t_square_id = self.get_t_square_id(gt_id)
+        return "%s(%s)" % (self._students[t_square_id][0], t_square_id)
+
+    def get_team(self, gt_id):
+        self._load_teams()
+        return self._teams[gt_id]
+
+    def get_teams(self):
+        self._load_teams()
+        return sorted([team for team in self._members.keys() if team != "None"])  # "None" holds students without a team
+
+    def get_members(self, team):
+        self._load_teams()
+        return self._members[team]
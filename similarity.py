@@ -0,0 +1,125 @@
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+
+SHINGLE_SIZE = 5  # tokens per shingle
+PERMUTATIONS = 128  # MinHash signature length
+MAX_FILE_SIZE = 1024 * 1024  # bigger files are data or build output, not code
+SEED = 6300  # fixed, so signatures from different runs can be compared
+
+HASH_MASK = (1 << 62) - 1  # small enough to stay a python int on 64-bit builds
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def get_masks(permutations=PERMUTATIONS, seed=SEED):
+    rng = random.Random(seed)
+    return [rng.getrandbits(62) for _ in range(permutations)]
+
+
+MASKS = get_masks()
+
+
+def get_shingles(files, shingle_size=SHINGLE_SIZE):
+    # hashes of every run of shingle_size tokens, so whitespace, formatting and file names don't matter
+    shingles = set()
+    for path, contents in files:
+        if len(contents) > MAX_FILE_SIZE or '\0' in contents:
+            continue  # binary
+
+        tokens = TOKEN_PATTERN.findall(contents)
+        if len(tokens) == 0:
+            continue
+
+        for start in range(max(1, len(tokens) - shingle_size + 1)):
+            shingle = '\0'.join(tokens[start:start + shingle_size])
+            shingles.add(struct.unpack('<Q', hashlib.md5(shingle).digest()[:8])[0] & HASH_MASK)
+
+    return shingles
+
+
+def get_signature(shingles, masks=MASKS):
+    # one minimum per permutation; XORing an already uniform hash with a random mask stands in for a permutation, which
+    # keeps the inner loop in C
+    if len(shingles) == 0:
+        return None
+
+    shingles = list(shingles)
+    return [min(map(mask.__xor__, shingles)) for mask in masks]
+
+
+def get_bands(threshold, permutations=PERMUTATIONS):
+    # (bands, rows) with the LSH threshold, (1 / bands) ** (1 / rows), a little under threshold, so pairs just over it
+    # are still likely to share a bucket
+    best = (permutations, 1)
+    for rows in range(1, permutations + 1):
+        bands = permutations // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold * 0.9:
+            best = (bands, rows)
+
+    return best
+
+
+def get_similarity(signature, other_signature):
+    # estimated Jaccard similarity of the two shingle sets
+    return sum([1 for value, other_value in zip(signature, other_signature) if value == other_value]) / float(len(signature))
+
+
+def find_similar_pairs(signatures, threshold):
+    # signatures: name -> signature. Returns [(name, other name, similarity)] for every pair at or over threshold. Only
+    # names that share a bucket in some band get compared, so it's about linear in the number of names.
+    bands, rows = get_bands(threshold, len(signatures.values()[0]) if len(signatures) > 0 else PERMUTATIONS)
+    candidates = set()
+    for band in range(bands):
+        buckets = {}
+        for name, signature in signatures.items():
+            buckets.setdefault(tuple(signature[band * rows:(band + 1) * rows]), []).append(name)
+
+        for names in buckets.values():
+            names.sort()
+            for index, name in enumerate(names):
+                for other_name in names[index + 1:]:
+                    candidates.add((name, other_name))
+
+    pairs = []
+    for name, other_name in candidates:
+        similarity = get_similarity(signatures[name], signatures[other_name])
+        if similarity >= threshold:
+            pairs.append((name, other_name, similarity))
+
+    return sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))
+
+
+class SignatureCache:
+    # commit SHA -> MinHash signature of its assignment files, so a re-run only reads and hashes new commits
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._lock = threading.Lock()
+        try:
+            with open(file_name, 'r') as cache_file:
+                self._signatures = json.load(cache_file)
+        except (IOError, ValueError):
+            self._signatures = {}
+
+    def get_key(self, sha, paths):
+        # the same commit hashed over different folders is a different signature
+        return '%s:%s' % (sha, ','.join(sorted(paths or [])))
+
+    def has(self, sha, paths):
+        with self._lock:
+            return self.get_key(sha, paths) in self._signatures
+
+    def get(self, sha, paths):
+        with self._lock:
+            return self._signatures.get(self.get_key(sha, paths))
+
+    def put(self, sha, paths, signature):
+        with self._lock:
+            self._signatures[self.get_key(sha, paths)] = signature
+
+    def save(self):
+        with self._lock:
+            with open(self.file_name, 'w') as cache_file:
+                json.dump(self._signatures, cache_file)
@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import zipfile
+
+# a hex run that isn't part of a longer word, so 64-character hashes and random tokens don't match
+FULL_COMMIT_ID = re.compile(r'(?<![0-9A-Za-z])([0-9a-fA-F]{40})(?![0-9A-Za-z])')
+COMMIT_URL = re.compile(r'/commits?/([0-9a-fA-F]{7,40})(?![0-9A-Za-z])')
+# an abbreviated SHA only counts right after a label like 'Commit ID:' or 'my commit is', tags and punctuation allowed in
+# between; on its own, a short hex run is as likely to be part of a UUID or a link id
+SHORT_COMMIT_ID = re.compile(r'\b(?:commits?|sha)(?:\s|<[^>]*>|[:#=.-]|\b(?:id|hash|sha|is|was)\b)*([0-9a-fA-F]{7,39})(?![0-9A-Za-z])',
+                             re.IGNORECASE)
+
+SUBMISSION_TEXT_SUFFIX = "_submissionText.html"
+TIMESTAMP_FILE = "timestamp.txt"
+
+
+class SubmissionFolder:
+    # an extracted T-Square bulk download
+    def __init__(self, submission_folder_name):
+        if not os.path.isdir(submission_folder_name):
+            raise IOError("Submission folder name '%s' not found. Exiting." % submission_folder_name)
+
+        self.submission_folder_name = submission_folder_name
+        self.assignment_alias = os.path.basename(os.path.normpath(submission_folder_name))
+
+    def list_folders(self):
+        return os.listdir(self.submission_folder_name)
+
+    def open(self, folder, file_name):
+        return open(os.path.join(self.submission_folder_name, folder, file_name), 'r')
+
+    def get_mtime(self, folder):
+        folder_path = os.path.join(self.submission_folder_name, folder)
+        if not os.path.isdir(folder_path):
+            return None
+
+        mtimes = [os.path.getmtime(os.path.join(folder_path, file_name)) for file_name in os.listdir(folder_path)]
+        mtimes.append(os.path.getmtime(folder_path))  # catches deleted files
+
+        return max(mtimes)
+
+    def close(self):
+        pass
+
+
+class SubmissionArchive:
+    # the T-Square bulk download zip, read in place; only the members that get opened are decompressed
+    def __init__(self, archive_name):
+        try:
+            self._zip = zipfile.ZipFile(archive_name, 'r')
+        except (IOError, zipfile.BadZipfile):
+            raise IOError("Submission archive '%s' not found or not a zip file. Exiting." % archive_name)
+
+        self.archive_name = archive_name
+        self._members = {}  # student folder -> {file name -> zip member}
+
+        names = [info.filename for info in self._zip.infolist() if not info.filename.endswith('/')]
+        top_levels = set([name.split('/')[0] for name in names if '/' in name])
+
+        # T-Square puts everything under a folder named after the assignment; student folders end with '(<t-square id>)'
+        if len(top_levels) == 1 and not list(top_levels)[0].endswith(')'):
+            self._root = list(top_levels)[0] + '/'
+            self.assignment_alias = list(top_levels)[0]
+        else:
+            self._root = ''
+            self.assignment_alias = os.path.splitext(os.path.basename(archive_name))[0]
+
+        for info in self._zip.infolist():
+            if not info.filename.startswith(self._root):
+                continue
+            parsed = info.filename[len(self._root):].split('/')
+            if len(parsed) < 2:
+                continue  # files next to the student folders, e.g. grades.csv
+
+            files = self._members.setdefault(parsed[0], {})  # keeps empty student folders too
+            if parsed[-1] != '':
+                files['/'.join(parsed[1:])] = info
+
+    def list_folders(self):
+        return self._members.keys()
+
+    def open(self, folder, file_name):
+        try:
+            info = self._members[folder][file_name]
+        except KeyError:
+            raise IOError("'%s/%s' not found in %s" % (folder, file_name, self.archive_name))
+
+        return self._zip.open(info, 'r')
+
+    def get_mtime(self, folder):
+        if len(self._members.get(folder, {})) == 0:
+            return None
+
+        return max([time.mktime(info.date_time + (0, 0, -1)) for info in self._members[folder].values()])
+
+    def close(self):
+        self._zip.close()
+
+
+def open_submissions(submission_folder_name):
+    if submission_folder_name.lower().endswith('.zip'):
+        return SubmissionArchive(submission_folder_name)
+
+    return SubmissionFolder(submission_folder_name)
+
+
+def find_commit_id(lines):
+    # lines can be any iterable of text, e.g. an open file; stops reading at the first full commit ID or commit URL
+    short_commit_id = None
+
+    for line in lines:
+        full_match = FULL_COMMIT_ID.search(line)
+        url_match = COMMIT_URL.search(line)
+        if full_match != None and (url_match == None or full_match.start() < url_match.start()):
+            return full_match.group(1).lower()
+        if url_match != None:
+            return url_match.group(1).lower()
+
+        if short_commit_id == None:
+            for match in SHORT_COMMIT_ID.finditer(line):
+                candidate = match.group(1)
+                # dates and other plain numbers are hex too; an abbreviated SHA almost always has letters and digits
+                if re.search(r'[a-fA-F]', candidate) and re.search(r'[0-9]', candidate):
+                    short_commit_id = candidate.lower()
+                    break
+
+    return short_commit_id
+
+
+def parse_submission_folder(submission_folder_name):
+    # student folder name -> commit ID, 'Invalid' or 'Missing' for a whole T-Square export (folder or zip)
+    commit_ids = {}
+
+    submissions = open_submissions(submission_folder_name)
+    try:
+        for folder in submissions.list_folders():
+            if not folder.endswith(')'):
+                continue  # .DS_Store and anything else that isn't a student folder
+
+            try:
+                with submissions.open(folder, folder + SUBMISSION_TEXT_SUFFIX) as submission_file:
+                    commit_id = find_commit_id(submission_file)
+            except IOError:
+                commit_ids[folder] = "Missing"
+                continue
+
+            if commit_id == None:
+                commit_ids[folder] = "Invalid"
+            else:
+                commit_ids[folder] = commit_id
+    finally:
+        submissions.close()
+
+    return commit_ids
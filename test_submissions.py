@@ -1,5 +1,16 @@
 from unittest import TestCase
+import copy
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+
 import prep_repos
+import record_store
+import records
+import similarity
+import submission_parser
 
 '''
 Running from command line (for command line prompts working):
@@ -11,6 +22,18 @@ Examples:
     python -m unittest test_submissions.TestSubmissions.test_create_student_json
     python -m unittest test_submissions.TestSubmissions.test_generate_A3_report_individual
     python -m unittest test_submissions.TestSubmissions.test_generate_D0_report
+    python -m unittest test_submissions.TestSubmissions.test_generate_term_reports
+
+The other test cases need no class data:
+    python -m unittest test_submissions.TestSubmissionParser
+    python -m unittest test_submissions.TestDeadlines
+    python -m unittest test_submissions.TestWarmCache
+    python -m unittest test_submissions.TestResume
+    python -m unittest test_submissions.TestIncremental
+    python -m unittest test_submissions.TestSubmissionArchive
+    python -m unittest test_submissions.TestRecords
+    python -m unittest test_submissions.TestRecordStore
+    python -m unittest test_submissions.TestSimilarity
 '''
 
 class TestSubmissions(TestCase):
@@ -36,6 +59,26 @@ class TestSubmissions(TestCase):
 
         return submissions
 
+    # assignments: dicts with assignment, deadline, report_name, students and (optionally) is_team_project
+    def generate_reports_for_term(self, assignments, submissions=None, pull_from_github=True):
+        if submissions == None:
+            submissions = prep_repos.Submissions()
+
+        submissions.pull_from_github = pull_from_github
+        manifest = []
+        for assignment in assignments:
+            manifest.append({'submission_folder_name': "./submissions/%s" % assignment['assignment'],
+                             'deadline': assignment['deadline'],
+                             'whitelist': assignment['students'],
+                             'is_team_project': assignment.get('is_team_project', False)})
+        submissions.prep_term(manifest)
+
+        for assignment in assignments:
+            submissions.generate_report(assignment['assignment'], assignment['students'], assignment['report_name'],
+                                        is_team_project=assignment.get('is_team_project', False))
+
+        return submissions
+
     def test_create_student_json(self):
         submissions = prep_repos.Submissions()
         submissions.create_student_json("students_full.txt")
@@ -144,3 +187,479 @@ class TestSubmissions(TestCase):
         self.generate_report_for_assignment(assignment, deadline, report_name, students, is_team_project=True,
                                             pull_from_github=False)
 
+    def test_generate_term_reports(self):
+        students = self.get_students_list_from_file('students.txt')
+        teams = self.get_students_list_from_file('students_group_project_teams.txt')
+        assignments = [
+            {'assignment': "Assignment 1_ Team Matching Survey", 'deadline': "2017-08-28 12:05:00", 'students': students,
+             'report_name': "report_A1_my_students.txt"},
+            {'assignment': "Assignment 2_ Git usage", 'deadline': "2017-09-02 12:05:00", 'students': students,
+             'report_name': "report_A2_my_students.txt"},
+            {'assignment': "Assignment 3_ Basic Java coding and JUnit", 'deadline': "2017-09-09 12:05:00",
+             'students': students, 'report_name': "report_A3_my_students.txt"},
+            {'assignment': "Assignment 4_ Simple Android App", 'deadline': "2017-09-16 12:05:00", 'students': students,
+             'report_name': "report_A4_my_students.txt"},
+            {'assignment': "Assignment 5_ Software Design", 'deadline': "2017-09-23 12:05:00", 'students': students,
+             'report_name': "report_A5_my_students.txt"},
+            {'assignment': "Assignment 6_ Category partition", 'deadline': "2017-10-28 12:05:00", 'students': students,
+             'report_name': "report_A6_my_students.txt"},
+            {'assignment': "Assignment 7_ White-Box Testing", 'deadline': "2017-11-04 12:05:00", 'students': students,
+             'report_name': "report_A7_my_students.txt"},
+            {'assignment': "Group Project, Deliverable 0", 'deadline': "2017-09-23 12:05:00", 'students': teams,
+             'report_name': "report_group_D0_my_students.txt", 'is_team_project': True},
+            {'assignment': "Group Project, Deliverable 1", 'deadline': "2017-09-30 12:05:00", 'students': teams,
+             'report_name': "report_group_D1_my_students.txt", 'is_team_project': True},
+            {'assignment': "Group Project, Deliverable 2", 'deadline': "2017-10-07 12:05:00", 'students': teams,
+             'report_name': "report_group_D2_my_students.txt", 'is_team_project': True},
+            {'assignment': "Group Project, Deliverable 3", 'deadline': "2017-10-14 12:05:00", 'students': teams,
+             'report_name': "report_group_D3_my_students.txt", 'is_team_project': True},
+            {'assignment': "Group Project, Deliverable 4", 'deadline': "2017-10-21 12:05:00", 'students': teams,
+             'report_name': "report_group_D4_my_students.txt", 'is_team_project': True},
+        ]
+
+        self.generate_reports_for_term(assignments)
+
+
+class TestSubmissionParser(TestCase):
+    def test_full_commit_id(self):
+        commit_ID = '0123456789abcdef0123456789ABCDEF01234567'
+        self.assertEqual(submission_parser.find_commit_id(['<p>%s</p>' % commit_ID]), commit_ID.lower())
+
+    def test_abbreviated_commit_id(self):
+        self.assertEqual(submission_parser.find_commit_id(['<p>Commit ID: <b>ab12cd3</b></p>']), 'ab12cd3')
+        self.assertEqual(submission_parser.find_commit_id(['<p>my commit is AB12CD34</p>']), 'ab12cd34')
+
+    def test_commit_url(self):
+        lines = ['<a href="https://github.gatech.edu/gt-omscs-se-2017fall/6300Fall17gt0/commit/ab12cd3ef">commit</a>']
+        self.assertEqual(submission_parser.find_commit_id(lines), 'ab12cd3ef')
+
+    def test_full_commit_id_wins_over_earlier_abbreviated_one(self):
+        lines = ['<p>commit ab12cd3</p>', '<p>%s</p>' % ('f0' * 20)]
+        self.assertEqual(submission_parser.find_commit_id(lines), 'f0' * 20)
+
+    def test_non_hex_token_is_invalid(self):
+        self.assertEqual(submission_parser.find_commit_id(['<p>%s</p>' % ('z' * 40)]), None)
+        self.assertEqual(submission_parser.find_commit_id(['<p>%s</p>' % ('a1' * 32)]), None)  # 64 characters
+
+    def test_unlabeled_hex_is_invalid(self):
+        lines = ['<p>see 550e8400-e29b-41d4-a716-446655440000</p>', '<a href="/files/ab12cd34ef">notes</a>']
+        self.assertEqual(submission_parser.find_commit_id(lines), None)
+        self.assertEqual(submission_parser.find_commit_id(['<p>commit 2017090</p>']), None)  # a date, not a SHA
+
+
+class TestDeadlines(TestCase):
+    deadline = "2017-09-09 12:05:00"
+    deadline_epoch = 1504958700
+
+    def get_graded(self, epoch_github, epoch_t_square, gt_id='gt0', commit_id_valid=True):
+        result = records.SubmissionResult()
+        result.commit_id_valid = commit_id_valid
+        result.epoch_github = epoch_github
+        result.epoch_t_square = epoch_t_square
+        return ('900', records.StudentRecord('Student0', gt_id, {'A3': result}))
+
+    def evaluate(self, graded, extensions=None, grace_period=0):
+        submissions = prep_repos.Submissions()
+        submissions.grace_period = grace_period
+        submissions.evaluate_deadlines(graded, 'A3', submissions.get_deadlines(self.deadline, extensions))
+        return [(current_student.results['A3'].github_status, current_student.results['A3'].t_square_status)
+                for _, current_student in graded]
+
+    def test_github_before_and_t_square_on_deadline(self):
+        graded = [self.get_graded(self.deadline_epoch - 1, self.deadline_epoch),
+                  self.get_graded(self.deadline_epoch, self.deadline_epoch + 1)]
+        self.assertEqual(self.evaluate(graded), [(records.OK, records.OK), (records.LATE, records.LATE)])
+
+    def test_extension(self):
+        graded = [self.get_graded(self.deadline_epoch + 3600, self.deadline_epoch + 3600, 'gt0'),
+                  self.get_graded(self.deadline_epoch + 3600, self.deadline_epoch + 3600, 'gt1')]
+        self.assertEqual(self.evaluate(graded, {'gt0': "2017-09-10 12:05:00"}),
+                         [(records.OK, records.OK), (records.LATE, records.LATE)])
+
+    def test_grace_period(self):
+        graded = [self.get_graded(self.deadline_epoch + 30, self.deadline_epoch + 60),
+                  self.get_graded(self.deadline_epoch + 60, self.deadline_epoch + 61)]
+        self.assertEqual(self.evaluate(graded, grace_period=60), [(records.OK, records.OK), (records.LATE, records.LATE)])
+
+    def test_nothing_to_check(self):
+        graded = [self.get_graded(None, None, commit_id_valid=None), self.get_graded(None, None, commit_id_valid=False)]
+        self.assertEqual(self.evaluate(graded), [(None, None), (records.NOT_APPLICABLE, None)])
+
+    def test_malformed_deadline(self):
+        self.assertRaises(ValueError, prep_repos.Submissions().get_deadlines, "2017-09-09")
+
+
+class RemoteReposTestCase(TestCase):
+    # local bare repos stand in for GitHub, one per student, each with a submission naming its first commit
+    student_count = 1
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        self.env = dict(os.environ, GIT_AUTHOR_NAME='Student', GIT_AUTHOR_EMAIL='student@example.com',
+                        GIT_COMMITTER_NAME='Student', GIT_COMMITTER_EMAIL='student@example.com')
+
+        work = os.path.join(self.root, 'work')
+        os.makedirs(os.path.join(work, 'submissions', 'Assignment 1'))
+        with open(os.path.join(work, 'students_full.txt'), 'w') as students_file:
+            for index in range(self.student_count):
+                students_file.write('Student%d\tgt%d\t90%d\n' % (index, index, index))
+                self.add_repo(index)
+
+        os.chdir(work)
+        self.submissions = prep_repos.Submissions()
+        self.submissions.git_host = 'file://' + os.path.join(self.root, 'remotes')
+        self.submissions.git_context = 'context'
+        self.submissions.create_student_json('students_full.txt')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def git(self, cwd, *arguments):
+        return subprocess.check_output(('git',) + arguments, cwd=cwd, env=self.env).strip()
+
+    def get_source(self, index):
+        return os.path.join(self.root, 'source', 'gt%d' % index)
+
+    def get_remote(self, index):
+        return os.path.join(self.root, 'remotes', 'context', '6300Fall17gt%d.git' % index)
+
+    def get_submission_file(self, index):
+        return os.path.join(self.root, 'work', 'submissions', 'Assignment 1', 'Student%d(90%d)' % (index, index),
+                            'Student%d(90%d)_submissionText.html' % (index, index))
+
+    def add_repo(self, index):
+        os.makedirs(self.get_source(index))
+        self.git(self.get_source(index), 'init', '-q')
+        self.git(self.get_source(index), 'symbolic-ref', 'HEAD', 'refs/heads/master')
+        commit_ID = self.commit(index, 'first')
+        self.git(self.root, 'clone', '-q', '--bare', self.get_source(index), self.get_remote(index))
+
+        submission = os.path.dirname(self.get_submission_file(index))
+        os.makedirs(submission)
+        with open(self.get_submission_file(index), 'w') as submission_file:
+            submission_file.write('<p>%s</p>' % commit_ID)
+        with open(os.path.join(submission, 'timestamp.txt'), 'w') as timestamp_file:
+            timestamp_file.write('20170909120000000')
+
+    def commit(self, index, message):
+        with open(os.path.join(self.get_source(index), 'file.txt'), 'w') as source_file:
+            source_file.write(message)
+        self.git(self.get_source(index), 'add', 'file.txt')
+        self.git(self.get_source(index), 'commit', '-q', '-m', message)
+        return self.git(self.get_source(index), 'rev-parse', 'HEAD')
+
+    def push(self, index, branch='master'):
+        self.git(self.get_source(index), 'push', '-q', self.get_remote(index), 'HEAD:%s' % branch)
+
+    def count_calls(self, method_name):
+        # GT IDs of the students each later call of a setup_student_repo-like method is for, in order
+        calls = []
+        method = getattr(self.submissions, method_name)
+
+        def counted(current_student, *arguments):
+            calls.append(current_student.gt_id)
+            return method(current_student, *arguments)
+
+        setattr(self.submissions, method_name, counted)
+        return calls
+
+    def prep(self):
+        self.submissions.prep_repos('./submissions/Assignment 1', '2017-09-09 12:05:00')
+
+    def get_results(self):
+        store = self.submissions.open_record_store()
+        try:
+            return dict([(record.gt_id, record.results.get('Assignment 1')) for record in store.load_students().values()])
+        finally:
+            store.close()
+
+
+class TestWarmCache(RemoteReposTestCase):
+    def get_fetched_master(self):
+        return self.git(os.path.join('Repos', '6300Fall17gt0'), 'rev-parse', 'origin/master')
+
+    def test_warm_repo_isnt_fetched_again(self):
+        self.submissions.keep_repos_warm(rounds=1)
+        warm_commit_ID = self.git(self.get_source(0), 'rev-parse', 'HEAD')
+        pushed_commit_ID = self.commit(0, 'second')
+        self.push(0)
+
+        self.submissions.warm_cache_max_age = 3600
+        self.prep()
+        self.assertEqual(self.get_fetched_master(), warm_commit_ID)
+
+        self.submissions.warm_cache_max_age = None
+        self.prep()
+        self.assertEqual(self.get_fetched_master(), pushed_commit_ID)
+
+
+class TestResume(RemoteReposTestCase):
+    student_count = 5
+
+    def test_resume_skips_repos_already_set_up(self):
+        self.submissions.resume = True
+        set_up = self.count_calls('setup_student_repo')
+        setup_student_repo = self.submissions.setup_student_repo
+
+        def interrupt(current_student, *arguments):
+            if len(set_up) == 3:
+                raise KeyboardInterrupt
+            return setup_student_repo(current_student, *arguments)
+
+        self.submissions.setup_student_repo = interrupt
+        self.assertRaises(KeyboardInterrupt, self.prep)
+        self.assertEqual(set_up, ['gt0', 'gt1', 'gt2'])  # interrupted while setting up gt3
+
+        del self.submissions.setup_student_repo
+        set_up = self.count_calls('setup_student_repo')
+        self.prep()
+        self.assertEqual(set_up, ['gt3', 'gt4'])
+        self.assertEqual([result.commit_id_valid for gt_id, result in sorted(self.get_results().items())], [True] * 5)
+        self.assertFalse(os.path.isfile(self.submissions.checkpoint_filename))
+
+
+class TestIncremental(RemoteReposTestCase):
+    student_count = 2
+
+    def setUp(self):
+        RemoteReposTestCase.setUp(self)
+        self.submissions.incremental = True
+        self.prep()
+        self.parsed = self.count_calls('read_submission')
+        self.set_up = self.count_calls('setup_student_repo')
+
+    def test_unchanged_students_are_skipped(self):
+        self.prep()
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(self.set_up, [])
+        self.assertTrue(self.get_results()['gt0'].commit_id_valid)
+
+    def test_push_to_another_branch(self):
+        self.commit(1, 'feature')
+        self.push(1, 'feature')
+        self.prep()
+        self.assertEqual(self.parsed, ['gt1'])
+        self.assertEqual(self.set_up, ['gt1'])
+
+    def test_touched_submission_is_parsed_again(self):
+        mtime = os.path.getmtime(self.get_submission_file(0)) + 60
+        os.utime(self.get_submission_file(0), (mtime, mtime))
+        self.prep()
+        self.assertEqual(self.parsed, ['gt0'])
+        self.assertTrue(self.get_results()['gt0'].commit_id_valid)
+
+
+class TestSubmissionArchive(RemoteReposTestCase):
+    # the T-Square bulk download zip, built from the extracted submissions
+    student_count = 2
+
+    def make_archive(self, file_name, root='Assignment 1/', extra_members=()):
+        folder = os.path.join('submissions', 'Assignment 1')
+        with zipfile.ZipFile(file_name, 'w') as archive:
+            for student_folder in sorted(os.listdir(folder)):
+                for member in sorted(os.listdir(os.path.join(folder, student_folder))):
+                    archive.write(os.path.join(folder, student_folder, member), root + student_folder + '/' + member)
+            for member, contents in extra_members:
+                archive.writestr(root + member, contents)
+
+        return file_name
+
+    def test_root_folder(self):
+        archive = submission_parser.SubmissionArchive(self.make_archive('bulk_download.zip', extra_members=[
+            ('grades.csv', 'Student0,900\n'), ('Student9(909)/', '')]))
+        try:
+            self.assertEqual(archive.assignment_alias, 'Assignment 1')
+            self.assertEqual(sorted(archive.list_folders()), ['Student0(900)', 'Student1(901)', 'Student9(909)'])
+            self.assertEqual(archive.get_mtime('Student9(909)'), None)
+            with archive.open('Student0(900)', 'timestamp.txt') as timestamp_file:
+                self.assertEqual(timestamp_file.read(), '20170909120000000')
+            self.assertRaises(IOError, archive.open, 'Student0(900)', 'missing.txt')
+            self.assertRaises(IOError, archive.open, 'Student9(909)', 'timestamp.txt')
+        finally:
+            archive.close()
+
+    def test_no_root_folder(self):
+        archive = submission_parser.SubmissionArchive(self.make_archive('Assignment 2.zip', root=''))
+        try:
+            self.assertEqual(archive.assignment_alias, 'Assignment 2')
+            self.assertEqual(sorted(archive.list_folders()), ['Student0(900)', 'Student1(901)'])
+        finally:
+            archive.close()
+
+    def test_not_a_zip(self):
+        with open('bulk_download.zip', 'w') as archive_file:
+            archive_file.write('not a zip')
+        self.assertRaises(IOError, submission_parser.SubmissionArchive, 'bulk_download.zip')
+
+    def test_same_records_as_the_folder(self):
+        self.prep()
+        from_folder = self.get_results()
+
+        self.submissions.create_student_json('students_full.txt')  # start over with empty records
+        self.make_archive('bulk_download.zip', extra_members=[('grades.csv', 'Student0,900\n')])
+        self.submissions.prep_repos('bulk_download.zip', '2017-09-09 12:05:00')
+        from_archive = self.get_results()
+
+        self.assertEqual(sorted(from_archive.keys()), ['gt0', 'gt1'])
+        for gt_id in from_folder:
+            self.assertTrue(from_archive[gt_id].commit_id_valid)
+            self.assertEqual(from_archive[gt_id].to_dict(), from_folder[gt_id].to_dict())
+
+
+class TestRecords(TestCase):
+    # a student_records.json entry from before epochs
+    legacy_result = {'commitID': 'abc1234', 'commitID valid': True, 'Timestamp GitHub': '2017-09-08 14:00:00',
+                     'Timestamp T-Square': 'Missing', 'Submission GitHub': 'ok', 'Submission T-Square': 'late',
+                     'Comment': 'regraded'}
+
+    def test_legacy_timestamps(self):
+        result = records.SubmissionResult.from_dict(self.legacy_result)
+        self.assertEqual(result.commit_id, 'abc1234')
+        self.assertEqual(result.epoch_github, 1504879200)
+        self.assertEqual(result.epoch_t_square, None)
+        self.assertEqual(result.github_status, records.OK)
+        self.assertEqual(result.t_square_status, records.LATE)
+        self.assertEqual(result.extra, {'Comment': 'regraded'})
+
+    def test_to_dict(self):
+        result = records.SubmissionResult.from_dict(self.legacy_result).to_dict()
+        self.assertEqual(result, {'commitID': 'abc1234', 'commitID valid': True, 'Epoch GitHub': 1504879200,
+                                  'Epoch T-Square': None, 'Submission GitHub': 'ok', 'Submission T-Square': 'late',
+                                  'Comment': 'regraded'})
+        self.assertEqual(records.SubmissionResult.from_dict(result).to_dict(), result)
+
+    def test_unparseable_timestamp_is_kept(self):
+        result = records.SubmissionResult.from_dict({'commitID': 'Missing', 'Timestamp GitHub': 'yesterday'})
+        self.assertEqual(result.epoch_github, None)
+        self.assertEqual(result.extra, {'Timestamp GitHub': 'yesterday'})
+        self.assertEqual(result.to_dict()['Timestamp GitHub'], 'yesterday')
+
+    def test_status_commit_id(self):
+        result = records.SubmissionResult()
+        result.set_commit_id('Invalid')
+        self.assertFalse(result.has_commit_id())
+        self.assertEqual(result.commit_status, records.INVALID)
+        self.assertEqual(result.get_commit_id(), 'Invalid')
+
+    def test_student_record(self):
+        record = records.StudentRecord.from_dict({'name': 'Student0', 'gt_id': 'gt0', 'A1': self.legacy_result})
+        self.assertEqual(record.results.keys(), ['A1'])
+        self.assertEqual(record.to_dict()['A1']['Epoch GitHub'], 1504879200)
+        self.assertEqual(record.to_dict()['name'], 'Student0')
+
+
+class TestRecordStore(TestCase):
+    students = {'900': {'name': 'Student0', 'gt_id': 'gt0',
+                        'A1': {'commitID': 'abc1234', 'commitID valid': True, 'Epoch GitHub': 1504879200,
+                               'Epoch T-Square': 1504958400, 'Submission GitHub': 'ok', 'Submission T-Square': 'ok'},
+                        'A2': {'commitID': 'Missing', 'Epoch T-Square': None}},
+                '901': {'name': 'Student1', 'gt_id': 'gt1',
+                        'A1': {'commitID': 'def5678', 'commitID valid': True, 'Epoch GitHub': 1505052000,
+                               'Epoch T-Square': 1504958460, 'Submission GitHub': 'late', 'Submission T-Square': 'ok'}}}
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def open_store(self, backend):
+        return record_store.open_record_store(backend, os.path.join(self.folder, 'student_records.json'),
+                                              os.path.join(self.folder, 'student_records.db'))
+
+    def check_round_trip(self, backend):
+        store = self.open_store(backend)
+        try:
+            store.import_records(self.students)
+            students = store.load_students('A1')
+            self.assertEqual(sorted(students.keys()), ['900', '901'])
+            self.assertEqual(students['901'].results['A1'].github_status, records.LATE)
+
+            result = students['901'].results['A1']
+            result.github_status = records.OK
+            store.save_result('901', 'A1', result)
+            store.flush()
+        finally:
+            store.close()
+
+        expected = copy.deepcopy(self.students)
+        expected['901']['A1']['Submission GitHub'] = 'ok'
+        store = self.open_store(backend)
+        try:
+            self.assertEqual(store.export_records(), expected)
+        finally:
+            store.close()
+
+    def check_find_students(self, backend):
+        store = self.open_store(backend)
+        try:
+            store.import_records(self.students)
+            self.assertEqual(store.find_students('A1', 'Submission GitHub', 'late'), ['901'])
+            self.assertEqual(store.find_students('A1', 'Submission T-Square', 'ok'), ['900', '901'])
+            self.assertEqual(store.find_students('A2', 'Submission GitHub', 'late'), [])
+        finally:
+            store.close()
+
+    def test_json_round_trip(self):
+        self.check_round_trip('json')
+
+    def test_sqlite_round_trip(self):
+        self.check_round_trip('sqlite')
+
+    def test_json_find_students(self):
+        self.check_find_students('json')
+
+    def test_sqlite_find_students(self):
+        self.check_find_students('sqlite')
+
+    def test_sqlite_loads_one_assignment(self):
+        store = self.open_store('sqlite')
+        try:
+            store.import_records(self.students)
+            self.assertEqual(store.load_students('A1')['900'].results.keys(), ['A1'])
+            self.assertEqual(sorted(store.load_students()['900'].results.keys()), ['A1', 'A2'])
+            self.assertEqual(store.get_result('900', 'A2').get_commit_id(), 'Missing')
+            self.assertEqual(store.get_result('901', 'A2'), None)
+        finally:
+            store.close()
+
+    def test_sqlite_import_leaves_other_students_alone(self):
+        store = self.open_store('sqlite')
+        try:
+            store.import_records(self.students)
+            store.import_records({'902': {'name': 'Student2', 'gt_id': 'gt2', 'A1': {'commitID': 'Invalid', 'Epoch T-Square': None}},
+                                  '900': {'name': 'Student0', 'gt_id': 'gt0', 'A2': {'commitID': 'Missing', 'Epoch T-Square': 1504958400}}})
+            exported = store.export_records()
+        finally:
+            store.close()
+
+        self.assertEqual(sorted(exported.keys()), ['900', '901', '902'])
+        self.assertEqual(exported['901'], self.students['901'])
+        self.assertEqual(exported['900']['A1'], self.students['900']['A1'])  # only the imported assignment is replaced
+        self.assertEqual(exported['900']['A2']['Epoch T-Square'], 1504958400)
+
+
+class TestSimilarity(TestCase):
+    def get_signature(self, prefix, count, changes=()):
+        tokens = ['%s%d' % (prefix, index) for index in range(count)]
+        for index in changes:
+            tokens[index] = 'changed%d' % index
+        return similarity.get_signature(similarity.get_shingles([('Main.java', ' '.join(tokens))]))
+
+    def test_near_copy_is_found(self):
+        signatures = {'gt0': self.get_signature('token', 400), 'gt1': self.get_signature('token', 400, [100, 300]),
+                      'gt2': self.get_signature('other', 400)}
+        pairs = similarity.find_similar_pairs(signatures, 0.8)
+        self.assertEqual([(name, other_name) for name, other_name, estimate in pairs], [('gt0', 'gt1')])
+        self.assertTrue(0.8 <= pairs[0][2] < 1.0)
+
+    def test_identical_signatures(self):
+        signature = self.get_signature('token', 50)
+        pairs = similarity.find_similar_pairs({'Team02': signature, 'Team01': list(signature)}, 0.9)
+        self.assertEqual(pairs, [('Team01', 'Team02', 1.0)])
+
+    def test_nothing_to_compare(self):
+        self.assertEqual(similarity.find_similar_pairs({}, 0.8), [])
+        self.assertEqual(similarity.get_signature(similarity.get_shingles([('data.bin', 'a\0b')])), None)
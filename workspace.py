@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import stat
+
+
+class Workspace:
+    # last use and size of every repo folder under Repos/, kept between runs so the least recently graded repos can be
+    # compacted or removed when the folder goes over budget
+    def __init__(self, file_name):
+        self.file_name = file_name
+        try:
+            with open(file_name, 'r') as workspace_file:
+                self._repos = json.load(workspace_file)  # repo name -> {'last_used', 'size', 'compacted'}
+        except (IOError, ValueError):
+            self._repos = {}
+
+    def has_repo(self, repo_name):
+        return repo_name in self._repos
+
+    def mark_used(self, repo_name, size, last_used):
+        self._repos[repo_name] = {'last_used': last_used, 'size': size, 'compacted': False}
+
+    def set_compacted(self, repo_name, size):
+        self._repos[repo_name]['size'] = size
+        self._repos[repo_name]['compacted'] = True
+
+    def is_compacted(self, repo_name):
+        return repo_name in self._repos and self._repos[repo_name]['compacted']
+
+    def get_total_size(self):
+        return sum([repo['size'] for repo in self._repos.values()])
+
+    def get_least_recently_used(self):
+        return sorted(self._repos.keys(), key=lambda repo_name: (self._repos[repo_name]['last_used'], repo_name))
+
+    def forget(self, repo_name):
+        self._repos.pop(repo_name, None)
+
+    def forget_all_but(self, repo_names):
+        # repos deleted by hand since the last run
+        for repo_name in set(self._repos.keys()) - set(repo_names):
+            del self._repos[repo_name]
+
+    def save(self):
+        with open(self.file_name, 'w') as workspace_file:
+            json.dump(self._repos, workspace_file)
+
+
+def remove_tree(path):
+    def make_writable(function, failed_path, exc_info):
+        # git makes its object files read-only, which windows won't delete
+        os.chmod(failed_path, stat.S_IWRITE)
+        function(failed_path)
+
+    shutil.rmtree(path, onerror=make_writable)
+
+
+def remove_working_tree(repo_path):
+    # everything but .git; 'git reset --hard' puts it back
+    for name in os.listdir(repo_path):
+        path = os.path.join(repo_path, name)
+        if name == '.git':
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            remove_tree(path)
+        else:
+            os.remove(path)